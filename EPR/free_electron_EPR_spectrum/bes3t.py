@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Python code provided as is.
+Made by Vincent Wieczny, from Chemistry Department, ENS de Lyon, France
+This code is under licence CC-BY-NC-SA. It enables you to reuse the code by mentioning the orginal author and without making profit from it.
+"""
+
+""" Lecture de spectres RPE expérimentaux et ajustement du modèle
+La fonction load lit un fichier Bruker BES3T (.DSC pour les paramètres,
+.DTA pour les données) ou un fichier texte à deux colonnes (champ,
+intensité). Les données binaires ne sont pas copiées : le fichier .DTA
+est projeté en mémoire (np.memmap) avec le format et l'ordre des octets
+décrits dans le .DSC (IRFMT, BSEQ, IKKF), sous la forme (YPTS, XPTS) pour
+les jeux de données à deux dimensions (champ x temps, température...).
+Le champ est converti en T.
+La fonction fit_spectrum ajuste g, DeltaB (largeur de la bande, sigma =
+DeltaB/6 comme dans free_electron_EPR_spectrum.py), l'amplitude et la
+ligne de base sur un spectre (dérivée 'der' ou absorption 'abs') par
+moindres carrés, avec résidus vectorisés et jacobienne analytique.
+La fonction fit_dataset ajuste toutes les tranches d'un jeu de données à
+deux dimensions sur un pool de processus ; chaque processus projette
+lui-même le fichier en mémoire et ne reçoit que des numéros de lignes.
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import least_squares
+
+from spectrum import h, muB, gaussian, gaussian_der
+
+formats = {'D': 'f8', 'F': 'f4', 'I': 'i4', 'S': 'i2', 'C': 'i1'}
+complex_formats = {'D': 'c16', 'F': 'c8'}
+byte_orders = {'BIG': '>', 'LIT': '<'}
+field_units = {'T': 1., 'mT': 1e-3, 'G': 1e-4, 'Gs': 1e-4}
+fit_names = ['g', 'DeltaB', 'amplitude', 'baseline']
+
+
+def read_dsc(path):
+    """ Paramètres du fichier .DSC (dictionnaire clé: valeur) ; les
+    nombres sont convertis, les chaînes sont débarrassées de leurs
+    apostrophes """
+    parameters = {}
+    key = None
+    with open(path, errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if key is not None:
+                # suite d'une valeur sur plusieurs lignes (terminée par \)
+                parameters[key] += '\n'+line.rstrip('\\')
+                if not line.endswith('\\'):
+                    key = None
+                continue
+            if not line.strip() or line[0] in '*#.':
+                continue
+            words = line.split(None, 1)
+            value = words[1].strip() if len(words)>1 else ''
+            parameters[words[0]] = value
+            if value.endswith('\\'):
+                parameters[words[0]] = value.rstrip('\\')
+                key = words[0]
+    for key, value in parameters.items():
+        value = value.strip("'")
+        try:
+            value = int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        parameters[key] = value
+    return parameters
+
+
+def data_dtype(parameters, fmt_key='IRFMT'):
+    """ dtype numpy des données d'après IRFMT (ou XFMT...), BSEQ et IKKF """
+    order = byte_orders[parameters.get('BSEQ', 'BIG')]
+    fmt = str(parameters.get(fmt_key, 'D')).split(',')[0].strip()
+    if str(parameters.get('IKKF', 'REAL')).split(',')[0].strip()=='CPLX' and fmt_key=='IRFMT':
+        if fmt not in complex_formats:
+            raise Exception('Format complexe "{}" non pris en charge'.format(fmt))
+        return np.dtype(order+complex_formats[fmt])
+    return np.dtype(order+formats[fmt])
+
+
+def axis(parameters, name, path):
+    """ Axe X ou Y : régulier (IDX) ou lu dans le fichier .XGF/.YGF (IGD) """
+    n = int(parameters.get(name+'PTS', 1))
+    if parameters.get(name+'TYP', 'IDX')=='IGD':
+        values = np.fromfile(os.path.splitext(path)[0]+'.'+name+'GF',
+                             dtype=data_dtype(parameters, name+'FMT'), count=n)
+        return values.astype(float)
+    start = float(parameters.get(name+'MIN', 0.))
+    width = float(parameters.get(name+'WID', n-1))
+    return start+width*np.arange(n)/max(n-1, 1)
+
+
+def load_bes3t(path):
+    """ Lit un fichier BES3T (chemin du .DSC ou du .DTA)
+    Renvoie un dictionnaire : B (champ en T), y (second axe ou None),
+    data (np.memmap de forme (XPTS,) ou (YPTS, XPTS)), parameters (.DSC).
+    """
+    base = os.path.splitext(path)[0]
+    parameters = read_dsc(base+'.DSC')
+    x_points = int(parameters['XPTS'])
+    y_points = int(parameters.get('YPTS', 1))
+    shape = (y_points, x_points) if y_points>1 else (x_points,)
+    data = np.memmap(base+'.DTA', dtype=data_dtype(parameters), mode='r', shape=shape)
+    B = axis(parameters, 'X', path)*field_units.get(parameters.get('XUNI', 'G'), 1.)
+    y = axis(parameters, 'Y', path) if y_points>1 else None
+    return {'B': B, 'y': y, 'data': data, 'parameters': parameters}
+
+
+def load_ascii(path, field_unit=1.):
+    """ Lit un fichier texte à deux colonnes (champ, intensité)
+    field_unit : facteur de conversion du champ en T (1e-4 pour des G)
+    """
+    B, data = np.loadtxt(path, unpack=True, usecols=(0, 1))
+    return {'B': B*field_unit, 'y': None, 'data': data, 'parameters': {}}
+
+
+def load(path, field_unit=1.):
+    if os.path.splitext(path)[1].upper() in ['.DSC', '.DTA']:
+        return load_bes3t(path)
+    return load_ascii(path, field_unit)
+
+
+def frequency(dataset, nu=None):
+    """ Fréquence micro-onde (Hz) : nu si elle est donnée, sinon MWFQ du
+    .DSC (les fichiers texte n'en ont pas : nu est alors obligatoire) """
+    if nu is not None:
+        return float(nu)
+    if 'MWFQ' not in dataset['parameters']:
+        raise ValueError('Fréquence micro-onde inconnue (pas de MWFQ) : donner nu')
+    return float(dataset['parameters']['MWFQ'])
+
+
+def model(p, B, nu, kind='der'):
+    """ Signal du modèle pour p = (g, DeltaB, amplitude, baseline) """
+    g, DeltaB, amplitude, baseline = p
+    x = B-h*nu/(g*muB)
+    if kind=='der':
+        return amplitude*gaussian_der(x, DeltaB/6)+baseline
+    return amplitude*gaussian(x, DeltaB/6)+baseline
+
+
+def jacobian(p, B, nu, kind='der'):
+    """ Dérivées partielles du modèle par rapport à g, DeltaB, amplitude
+    et baseline (tableau (len(B), 4)) """
+    g, DeltaB, amplitude, baseline = p
+    B_res = h*nu/(g*muB)
+    x = B-B_res
+    s = DeltaB/6
+    G = gaussian(x, s)
+    D = -x/s**2*G
+    J = np.empty((len(B), 4))
+    if kind=='der':
+        # dD/dx = G*(x**2/s**4-1/s**2), dD/ds = D*(x**2/s**3-3/s)
+        J[:, 0] = amplitude*G*(x**2/s**4-1/s**2)*B_res/g
+        J[:, 1] = amplitude*D*(x**2/s**3-3/s)/6
+        J[:, 2] = D
+    else:
+        # dG/dx = D, dG/ds = G*(x**2/s**3-1/s)
+        J[:, 0] = amplitude*D*B_res/g
+        J[:, 1] = amplitude*G*(x**2/s**3-1/s)/6
+        J[:, 2] = G
+    J[:, 3] = 1.
+    return J
+
+
+def initial_guess(B, data, nu, kind='der'):
+    """ Valeurs de départ lues sur le spectre """
+    baseline = np.median(data)
+    if kind=='der':
+        i_max, i_min = np.argmax(data), np.argmin(data)
+        B_res = (B[i_max]+B[i_min])/2
+        # les extrema de la dérivée d'une gaussienne sont à +-sigma
+        s = max(abs(B[i_min]-B[i_max])/2, abs(B[1]-B[0]))
+        amplitude = (data[i_max]-data[i_min])/2/(np.exp(-0.5)/(s**2*np.sqrt(2*np.pi)))
+        amplitude *= np.sign(B[i_min]-B[i_max])
+    else:
+        signal = data-baseline
+        i_max = np.argmax(signal)
+        B_res = B[i_max]
+        s = max(abs(np.sum(signal)*(B[1]-B[0])/signal[i_max])/np.sqrt(2*np.pi), abs(B[1]-B[0]))
+        amplitude = signal[i_max]*s*np.sqrt(2*np.pi)
+    return np.array([h*nu/(B_res*muB), 6*s, amplitude, baseline])
+
+
+def fit_spectrum(B, data, nu, kind='der', p0=None):
+    """ Ajuste g, DeltaB, amplitude et baseline sur un spectre
+    B : champ (T) ; data : signal ; nu : fréquence (Hz)
+    kind : 'der' (dérivée première, spectre usuel) ou 'abs'
+    Renvoie un dictionnaire des paramètres ajustés (et du coût).
+    """
+    B = np.asarray(B, dtype=float)
+    data = np.asarray(data, dtype=float)
+    if p0 is None:
+        p0 = initial_guess(B, data, nu, kind)
+    result = least_squares(lambda p: model(p, B, nu, kind)-data, p0,
+                           jac=lambda p: jacobian(p, B, nu, kind), x_scale='jac')
+    out = dict(zip(fit_names, result.x))
+    out['cost'] = result.cost
+    return out
+
+
+def fit_rows(path, start, stop, nu, kind='der', field_unit=1.):
+    """ Ajuste les lignes start..stop-1 d'un fichier (exécuté dans un processus) """
+    dataset = load(path, field_unit)
+    data = dataset['data'] if dataset['data'].ndim>1 else dataset['data'][np.newaxis]
+    out = []
+    for row in range(start, stop):
+        fit = fit_spectrum(dataset['B'], data[row].real, nu, kind)
+        out.append([fit[name] for name in fit_names+['cost']])
+    return np.array(out)
+
+
+def fit_dataset(path, nu=None, kind='der', max_workers=None, chunk=50, field_unit=1.):
+    """ Ajuste toutes les tranches d'un jeu de données à deux dimensions
+    nu : fréquence (Hz), lue dans le .DSC (MWFQ) si elle n'est pas donnée
+        (ValueError si le fichier n'a pas de MWFQ, ex. fichier texte)
+    chunk : nombre de tranches par tâche du pool de processus
+    field_unit : facteur de conversion du champ en T des fichiers texte
+    Renvoie un tableau (YPTS, 5) : g, DeltaB, amplitude, baseline, cost.
+    """
+    path = os.path.abspath(path)
+    dataset = load(path, field_unit)
+    nu = frequency(dataset, nu)
+    if dataset['data'].ndim==1:
+        return fit_rows(path, 0, 1, nu, kind, field_unit)
+    n_rows = dataset['data'].shape[0]
+    bounds = list(range(0, n_rows, chunk))+[n_rows]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fit_rows, path, start, stop, nu, kind, field_unit)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate([future.result() for future in futures])
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Load a Bruker BES3T (.DSC/.DTA) or two-column ASCII EPR spectrum and fit g and DeltaB')
+    parser.add_argument('path')
+    parser.add_argument('--nu', type=float, default=None, help='microwave frequency (Hz), MWFQ of the .DSC by default (required for ASCII files)')
+    parser.add_argument('--kind', choices=['der', 'abs'], default='der', help='first derivative or absorption spectrum')
+    parser.add_argument('--field-unit', type=float, default=1., help='field unit of ASCII files in T (1e-4 for G)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('-o', '--output', help='save the fits of a 2-D dataset to this text file')
+    args = parser.parse_args()
+
+    dataset = load(args.path, args.field_unit)
+    try:
+        nu = frequency(dataset, args.nu)
+    except ValueError as error:
+        parser.error('{} (--nu)'.format(error))
+    if dataset['data'].ndim==1:
+        import matplotlib.pyplot as plt
+
+        fit = fit_spectrum(dataset['B'], dataset['data'].real, nu, args.kind)
+        print(' '.join('{}={:.6g}'.format(name, fit[name]) for name in fit_names))
+        p = [fit[name] for name in fit_names]
+        plt.plot(dataset['B'], dataset['data'].real, color='black', label='Experimental spectrum')
+        plt.plot(dataset['B'], model(p, dataset['B'], nu, args.kind), color='red', label='Fit')
+        plt.xlabel('$B_0$ $\\mathrm{(T)}$')
+        plt.legend()
+        plt.show()
+    else:
+        fits = fit_dataset(args.path, nu, args.kind, args.workers, field_unit=args.field_unit)
+        print('{} slices fitted, g = {:.5f} +- {:.5f}'.format(len(fits), fits[:, 0].mean(), fits[:, 0].std()))
+        if args.output:
+            np.savetxt(args.output, fits, header=' '.join(fit_names+['cost']))
@@ -8,9 +8,11 @@ This code is under licence CC-BY-NC-SA. It enables you to reuse the code by ment
 """
 
 #Librairies
+import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import widgets
+import spectrum
 import scipy.constants as constants
 from matplotlib import rc
 import matplotlib.patches as patches
@@ -35,6 +37,19 @@ Bmin=0 #T
 Bmax=0.5 #T
 DeltaBmax=1e-1 #T
 
+#Hyperfine coupled nuclei, empty for a free electron
+#e.g. [spectrum.Nucleus(I=0.5, a=5e-3, n=2)] for two equivalent protons
+nuclei=[]
+#Principal values of an anisotropic g-tensor for a powder spectrum, None for isotropic g
+#e.g. (2.0023, 2.0023, 2.1) for an axial tensor
+g_tensor=None
+#Lineshape: 'gaussian', 'lorentzian', 'pseudo_voigt' or 'voigt'
+lineshape='gaussian'
+#Field modulation amplitude (T) for a lock-in detected signal, None for the ideal first derivative
+#e.g. 5e-3, overmodulation broadens the signal when Bm exceeds the linewidth
+Bm=None
+harmonic=1 #Detected harmonic of the modulation frequency
+
 # Modulated parameters
 parameters = {'DeltaB' : widgets.FloatSlider(value=0.05, description='$B_1$ $\mathrm{(T)}$', min=0.03, max=DeltaBmax),
               'B0' : widgets.FloatSlider(value=0.1, description='$B_0$ $\mathrm{(T)}$', min=Bmin, max=Bmax)}
@@ -59,30 +74,83 @@ def E_trans():
 def B_trans():
     return E_trans()/(g*muB)
 
+B_res=B_trans() #T
+
 #Sigma
 def sigma(DeltaB):
     return DeltaB/6
 
+#Lorentzian half-width, same full width at half maximum as the Gaussian
+def gamma(DeltaB):
+    return np.sqrt(2*np.log(2))*sigma(DeltaB)
+
+#Lineshape kernel
+def line(DeltaB):
+    return spectrum.Lineshape(shape=lineshape,sigma=sigma(DeltaB),gamma=gamma(DeltaB))
 
+#Scale of the derivative signal on its axis
+def der_scale(DeltaB):
+    return 1/(sigma(DeltaB)*np.sqrt(2*np.pi))
+
+#Absorption signal
 def signal_abs(B0,DeltaB):
-    return 1/(sigma(DeltaB)*np.sqrt(2*3.1416))*np.exp(-(B0-B_trans())**2/(2*sigma(DeltaB)**2))
+    return line(DeltaB).absorption(B0-B_res)
 
 #Derivative signal
 def signal_der(B0,DeltaB):
-    return 1/(sigma(DeltaB)*np.sqrt(2*3.1416))*-(B0-B_trans())/sigma(DeltaB)**2*signal_abs(B0,DeltaB)
+    return der_scale(DeltaB)*line(DeltaB).derivative(B0-B_res)
 
 #===========================================================
 # --- Plot of the updated curves ---------------------------
 #===========================================================
 
 
+#Dependency graph: the spectra only depend on DeltaB, moving B0 reuses them
+graph=widgets.Graph(parameters)
+
+#Simulated spectrum: hyperfine multiplet and/or powder pattern
+simulated=bool(nuclei) or g_tensor is not None
+
+#Resonance field histogram of the powder, computed once: it does not depend on the sliders
+@graph.node
+def powder_histogram():
+    return spectrum.powder_histogram(B,g_tensor,nu)
+
+def simulated_curve(DeltaB,derivative=False):
+    if g_tensor is not None:
+        curve=spectrum.powder_spectrum(B,g_tensor,nu,nuclei=nuclei,derivative=derivative,lineshape=line(DeltaB),histogram=graph['powder_histogram'])
+    else:
+        curve=spectrum.hyperfine_spectrum(B,B_res,nuclei,derivative=derivative,lineshape=line(DeltaB))
+    if derivative:
+        return der_scale(DeltaB)*curve
+    return curve
+
+@graph.node
+def abs_curve(DeltaB):
+    if simulated:
+        return simulated_curve(DeltaB)
+    return signal_abs(B,DeltaB)
+
+@graph.node
+def der_curve(DeltaB,abs_curve):
+    if Bm is not None:
+        return der_scale(DeltaB)*spectrum.harmonic_signal(B,abs_curve,Bm,harmonic,normalize=True)
+    if simulated:
+        return simulated_curve(DeltaB,derivative=True)
+    return signal_der(B,DeltaB)
+
 ## This function is called when the sliders are changed 
 def plot_data(B0,DeltaB):
+    graph.update(B0=B0,DeltaB=DeltaB)
     
-    lines['Absorption spot'].set_data(B0,signal_abs(B0,DeltaB))
-    lines['First derivative spot'].set_data(B0,signal_der(B0,DeltaB))
-    truc['$Abs_courbe$'].set_data(B,signal_abs(B,DeltaB))
-    truc['$Der_courbe$'].set_data(B,signal_der(B,DeltaB))
+    if simulated or Bm is not None:
+        lines['Absorption spot'].set_data([B0],[np.interp(B0,B,graph['abs_curve'])])
+        lines['First derivative spot'].set_data([B0],[np.interp(B0,B,graph['der_curve'])])
+    else:
+        lines['Absorption spot'].set_data(B0,signal_abs(B0,DeltaB))
+        lines['First derivative spot'].set_data(B0,signal_der(B0,DeltaB))
+    truc['$Abs_courbe$'].set_data(B,graph['abs_curve'])
+    truc['$Der_courbe$'].set_data(B,graph['der_curve'])
     truc['$E_\mathrm{trans}$'].set_data([B0,B0],[-1,1])
     r1.set_transform(mpl.transforms.Affine2D().translate(B0-DeltaB/2,-E_trans()/2)+ax1.transData)
     r1.set_width(DeltaB)
@@ -164,6 +232,7 @@ if __name__=='__main__':
     ax2.legend()
     ax3.legend()
  
+    level_of_detail = widgets.LevelOfDetail(truc.values())
     param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05])
     choose_widget = widgets.make_choose_plot(lines,box=[0.01,0.2,0.12, 0.1])
     reset_button = widgets.make_reset_button(param_widgets,box=[0.85, 0.05, 0.10, 0.05])
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Python code provided as is.
+Made by Vincent Wieczny, from Chemistry Department, ENS de Lyon, France
+This code is under licence CC-BY-NC-SA. It enables you to reuse the code by mentioning the orginal author and without making profit from it.
+"""
+
+""" Calcul de spectres RPE sur une grille de champ B régulière
+Une class Nucleus (spin I, constante hyperfine a en T, nombre n de noyaux
+équivalents) : même syntaxe que les widgets, Nucleus(I=0.5, a=0.5e-3, n=4).
+La fonction stick_spectrum donne les raies (positions et intensités) du
+multiplet hyperfin.
+La fonction hyperfine_spectrum calcule directement le spectre convolué
+par la forme de raie : dans l'espace de Fourier, chaque noyau multiplie
+le spectre par la transformée de son peigne de raies, calculée
+analytiquement. Le coût est en O(M log M) pour M points de champ, quel
+que soit le nombre de raies du multiplet.
+La fonction powder_spectrum calcule le spectre de poudre d'un tenseur g
+anisotrope (valeurs principales gx, gy, gz) : les champs de résonance de
+toutes les orientations d'une grille sur la demi-sphère sont calculés
+d'un bloc, accumulés dans un histogramme sur la grille de B puis
+convolués par la raie (et le multiplet hyperfin isotrope) par FFT.
+L'histogramme (powder_histogram) ne dépend pas de la raie et peut être
+réutilisé ; pour les grilles très fines, les orientations sont réparties
+par blocs sur un pool de processus partagé.
+Une class Lineshape donne la forme de raie (gaussienne, lorentzienne,
+pseudo-Voigt ou Voigt) : absorption, dérivée première analytique et
+transformée de Fourier, évaluées sur tout un tableau de champs. Elle
+peut remplacer la gaussienne (sigma) dans les fonctions ci-dessus.
+La fonction harmonic_signal simule la détection synchrone avec
+modulation du champ B+Bm*cos(2*pi*nu_m*t) : la composante sur la
+n-ième harmonique est la convolution du spectre d'absorption par un
+noyau dont la transformée de Fourier est 2*i**n*J_n(2*pi*f*Bm)
+(Jacobi-Anger), valable quelle que soit l'amplitude Bm, y compris en
+surmodulation.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from math import factorial
+from scipy.special import wofz, jv
+
+h = 6.62607004e-34 # constante de Planck (J.s)
+muB = 9.274009994e-24 # magnéton de Bohr (J/T)
+
+
+class Nucleus(object):
+    I = 0.5 # spin nucléaire
+    a = 0. # constante de couplage hyperfin (T)
+    n = 1 # nombre de noyaux équivalents
+
+    def __init__(self, **kwd):
+        for key, val in kwd.items():
+            if not hasattr(type(self), key):
+                raise Exception('Attribut "{}" non valide'.format(key))
+            setattr(self, key, val)
+
+    def m_values(self):
+        return np.arange(-self.I, self.I+0.5)
+
+
+class Lineshape(object):
+    shape = 'gaussian' # 'gaussian', 'lorentzian', 'pseudo_voigt' ou 'voigt'
+    sigma = 1e-4 # écart-type de la partie gaussienne (T)
+    gamma = 1e-4 # demi-largeur à mi-hauteur de la partie lorentzienne (T)
+    eta = 0.5 # fraction lorentzienne du pseudo-Voigt
+
+    def __init__(self, **kwd):
+        for key, val in kwd.items():
+            if not hasattr(type(self), key):
+                raise Exception('Attribut "{}" non valide'.format(key))
+            setattr(self, key, val)
+        if self.shape not in ['gaussian', 'lorentzian', 'pseudo_voigt', 'voigt']:
+            raise Exception('Forme de raie "{}" non valide'.format(self.shape))
+
+    def absorption(self, x):
+        """ Raie normalisée (aire 1) en x = B-B_res """
+        if self.shape=='gaussian':
+            return gaussian(x, self.sigma)
+        if self.shape=='lorentzian':
+            return lorentzian(x, self.gamma)
+        if self.shape=='pseudo_voigt':
+            return self.eta*lorentzian(x, self.gamma)+(1-self.eta)*gaussian(x, self.sigma)
+        return voigt(x, self.sigma, self.gamma)
+
+    def derivative(self, x):
+        """ Dérivée première de absorption par rapport à x """
+        if self.shape=='gaussian':
+            return gaussian_der(x, self.sigma)
+        if self.shape=='lorentzian':
+            return lorentzian_der(x, self.gamma)
+        if self.shape=='pseudo_voigt':
+            return self.eta*lorentzian_der(x, self.gamma)+(1-self.eta)*gaussian_der(x, self.sigma)
+        return voigt_der(x, self.sigma, self.gamma)
+
+    def ft(self, f):
+        """ Transformée de Fourier de absorption (f en 1/T) """
+        if self.shape=='gaussian':
+            return gaussian_ft(f, self.sigma)
+        if self.shape=='lorentzian':
+            return lorentzian_ft(f, self.gamma)
+        if self.shape=='pseudo_voigt':
+            return self.eta*lorentzian_ft(f, self.gamma)+(1-self.eta)*gaussian_ft(f, self.sigma)
+        return gaussian_ft(f, self.sigma)*lorentzian_ft(f, self.gamma)
+
+
+def gaussian(x, sigma):
+    return np.exp(-x**2/(2*sigma**2))/(sigma*np.sqrt(2*np.pi))
+
+
+def gaussian_der(x, sigma):
+    return -x/sigma**2*gaussian(x, sigma)
+
+
+def gaussian_ft(f, sigma):
+    """ Transformée de Fourier d'une gaussienne normalisée d'écart-type sigma """
+    return np.exp(-2*(np.pi*sigma*f)**2)
+
+
+def lorentzian(x, gamma):
+    return gamma/np.pi/(x**2+gamma**2)
+
+
+def lorentzian_der(x, gamma):
+    return -2*x*gamma/np.pi/(x**2+gamma**2)**2
+
+
+def lorentzian_ft(f, gamma):
+    return np.exp(-2*np.pi*gamma*np.abs(f))
+
+
+def voigt(x, sigma, gamma):
+    """ Profil de Voigt (gaussienne sigma convoluée par lorentzienne gamma)
+    calculé par la fonction de Faddeeva w(z) """
+    z = (x+1j*gamma)/(sigma*np.sqrt(2))
+    return wofz(z).real/(sigma*np.sqrt(2*np.pi))
+
+
+def voigt_der(x, sigma, gamma):
+    # w'(z) = -2 z w(z) + 2i/sqrt(pi)
+    z = (x+1j*gamma)/(sigma*np.sqrt(2))
+    dw = -2*z*wofz(z)+2j/np.sqrt(np.pi)
+    return dw.real/(2*np.sqrt(np.pi)*sigma**2)
+
+
+def line_ft(f, sigma, lineshape=None):
+    """ Transformée de la raie : lineshape si elle est donnée, sinon gaussienne sigma """
+    if lineshape is not None:
+        return lineshape.ft(f)
+    return gaussian_ft(f, sigma)
+
+
+def stick_spectrum(B_res, nuclei=()):
+    """ Raies du multiplet hyperfin centré en B_res
+    Renvoie (positions, intensités), les intensités étant normalisées
+    (somme 1). Les raies de même position sont regroupées.
+    """
+    positions = np.array([float(B_res)])
+    weights = np.array([1.])
+    for nucleus in nuclei:
+        m = nucleus.m_values()
+        for k in range(nucleus.n):
+            positions = np.add.outer(positions, nucleus.a*m).ravel()
+            weights = np.multiply.outer(weights, np.ones(len(m))/len(m)).ravel()
+        # regroupement des raies confondues (à 1e-12 T près)
+        key = np.round(positions/1e-12)
+        key, index, inverse = np.unique(key, return_index=True, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights)
+        positions = positions[index]
+    return positions, weights
+
+
+def fft_grid(B):
+    """ Grille de fréquences (en 1/T) pour la convolution sur B
+    B doit être régulière ; la grille est complétée par des zéros (taille
+    au moins double) pour éviter le repliement.
+    Renvoie (f, N, dB).
+    """
+    dB = B[1]-B[0]
+    N = 1
+    while N<2*len(B):
+        N *= 2
+    return np.fft.rfftfreq(N, dB), N, dB
+
+
+def comb_ft(f, nucleus):
+    """ Transformée de Fourier du peigne de raies d'un groupe de noyaux
+    équivalents (raies en m*a, m=-I..I, poids 1/(2I+1), puissance n) """
+    m = nucleus.m_values()
+    comb = np.exp(-2j*np.pi*np.multiply.outer(f, nucleus.a*m)).mean(axis=-1)
+    return comb**nucleus.n
+
+
+def spectrum_from_ft(S, B, N, dB, derivative=False):
+    """ Revient dans l'espace des champs (premiers len(B) points)
+    derivative : si True, renvoie la dérivée première par rapport à B """
+    if derivative:
+        S = S*2j*np.pi*np.fft.rfftfreq(N, dB)
+    return np.fft.irfft(S, N)[:len(B)]/dB
+
+
+def convolve_histogram(histogram, B, N, dB, sigma, nuclei=(), derivative=False, lineshape=None):
+    """ Convolue un histogramme de champs de résonance (grille de taille N
+    partant de B[0]) par la raie et le multiplet hyperfin """
+    f = np.fft.rfftfreq(N, dB)
+    S = np.fft.rfft(histogram)*line_ft(f, sigma, lineshape)
+    for nucleus in nuclei:
+        S = S*comb_ft(f, nucleus)
+    return spectrum_from_ft(S, B, N, dB, derivative)
+
+
+def hyperfine_spectrum(B, B_res, nuclei=(), sigma=1e-4, derivative=False, lineshape=None):
+    """ Spectre d'absorption (ou sa dérivée) du multiplet hyperfin
+    B : grille de champ régulière (T)
+    B_res : champ de résonance du centre du multiplet (T)
+    nuclei : liste de Nucleus
+    sigma : écart-type de la raie gaussienne (T)
+    lineshape : Lineshape, remplace la gaussienne sigma
+    Le spectre est normalisé (aire 1), comme signal_abs.
+    """
+    f, N, dB = fft_grid(B)
+    S = line_ft(f, sigma, lineshape)*np.exp(-2j*np.pi*f*(B_res-B[0]))
+    for nucleus in nuclei:
+        S = S*comb_ft(f, nucleus)
+    return spectrum_from_ft(S, B, N, dB, derivative)
+
+
+
+def modulation_kernel(f, Bm, harmonic=1):
+    """ Transformée de Fourier du noyau de détection de la n-ième harmonique
+    pour une modulation d'amplitude Bm (T) """
+    return 2*1j**harmonic*jv(harmonic, 2*np.pi*f*Bm)
+
+
+def harmonic_signal(B, absorption, Bm, harmonic=1, normalize=False):
+    """ Signal de la n-ième harmonique pour le spectre d'absorption donné
+    sur la grille régulière B (qui doit s'annuler aux bords)
+    Bm : amplitude de modulation (T)
+    harmonic : 1 (première harmonique, allure de dérivée première) ou 2...
+    normalize : si True, divise par Bm**n/(2**(n-1)*n!) ; pour Bm petit
+        devant la largeur de raie, le signal tend alors vers la dérivée
+        n-ième de l'absorption
+    """
+    f, N, dB = fft_grid(B)
+    S = np.fft.rfft(absorption, N)*modulation_kernel(f, Bm, harmonic)
+    signal = np.fft.irfft(S, N)[:len(B)]
+    if normalize:
+        signal = signal*2**(harmonic-1)*factorial(harmonic)/Bm**harmonic
+    return signal
+
+
+def orientation_grid(start, stop, n):
+    """ Directions start..stop-1 d'une grille de n points sur la
+    demi-sphère z>0 (spirale de Fibonacci : chaque point représente la
+    même aire, les poids sont donc égaux). La demi-sphère suffit car le
+    champ de résonance est le même pour l et -l.
+    Renvoie un tableau (stop-start, 3).
+    """
+    k = np.arange(start, stop)
+    z = (k+0.5)/n
+    r = np.sqrt(1-z**2)
+    phi = k*np.pi*(3-np.sqrt(5)) # angle d'or
+    return np.column_stack((r*np.cos(phi), r*np.sin(phi), z))
+
+
+def resonance_fields(g_tensor, directions, nu):
+    """ Champs de résonance h*nu/(g_eff*muB) pour chaque direction
+    g_eff = sqrt(somme des (g_i*l_i)**2) dans le repère propre du tenseur """
+    g_eff = np.sqrt(((np.asarray(g_tensor)*directions)**2).sum(axis=1))
+    return h*nu/(g_eff*muB)
+
+
+def field_histogram(B_res, B_start, dB, N, weights=None):
+    """ Histogramme des champs B_res sur la grille B_start+k*dB (k<N)
+    Chaque champ est partagé entre les deux points voisins (répartition
+    linéaire), ce qui évite le bruit d'échantillonnage d'un histogramme
+    simple. Les champs un peu avant B_start (jusqu'à N/4 points) sont
+    repliés en fin de tableau : la convolution circulaire ramène leur
+    queue au début de la grille.
+    """
+    if weights is None:
+        weights = np.ones(len(B_res))
+    x = (B_res-B_start)/dB
+    i = np.floor(x).astype(int)
+    frac = x-i
+    keep = (i>=-(N//4)) & (i<N-N//4-1)
+    i, frac, weights = i[keep]%N, frac[keep], weights[keep]
+    return (np.bincount(i, weights*(1-frac), minlength=N)
+            + np.bincount((i+1)%N, weights*frac, minlength=N))
+
+
+def powder_chunk(g_tensor, nu, start, stop, n, B_start, dB, N):
+    """ Histogramme des orientations start..stop-1 (exécuté dans un processus) """
+    B_res = resonance_fields(g_tensor, orientation_grid(start, stop, n), nu)
+    return field_histogram(B_res, B_start, dB, N)
+
+
+def main_process():
+    """ Même test que widgets.main_process (spectrum n'importe pas matplotlib) """
+    return multiprocessing.current_process().name=='MainProcess'
+
+
+executor = None
+
+
+def get_executor(max_workers=None):
+    """ Pool de processus partagé par les appels à powder_histogram """
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+    return executor
+
+
+def powder_histogram(B, g_tensor, nu, orientations=100000, chunk=250000, max_workers=None):
+    """ Histogramme normalisé des champs de résonance d'un tenseur g sur
+    la grille de B complétée par des zéros (voir fft_grid) ; il ne dépend
+    pas de la raie et peut être gardé d'un appel de powder_spectrum à
+    l'autre
+    g_tensor : valeurs principales (gx, gy, gz)
+    nu : fréquence (Hz)
+    orientations : nombre de directions de la grille
+    chunk : nombre de directions par bloc ; s'il y a plusieurs blocs et
+        max_workers différent de 1, ils sont calculés par un pool de
+        processus partagé (get_executor), sinon dans le processus courant
+        (plus rapide pour 1e5 directions)
+    """
+    f, N, dB = fft_grid(B)
+    bounds = list(range(0, orientations, chunk))+[orientations]
+    args = (g_tensor, nu)
+    grid = (orientations, B[0], dB, N)
+    if len(bounds)>2 and max_workers!=1 and main_process():
+        futures = [get_executor(max_workers).submit(powder_chunk, *(args+(start, stop)+grid))
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        histogram = sum(future.result() for future in futures)
+    else:
+        histogram = sum(powder_chunk(*(args+(start, stop)+grid))
+                        for start, stop in zip(bounds[:-1], bounds[1:]))
+    return histogram/orientations
+
+
+def powder_spectrum(B, g_tensor, nu, sigma=1e-4, nuclei=(), derivative=False,
+                    orientations=100000, chunk=250000, max_workers=None, lineshape=None,
+                    histogram=None):
+    """ Spectre de poudre (normalisé, aire 1) ou sa dérivée
+    B : grille de champ régulière (T)
+    g_tensor : valeurs principales (gx, gy, gz)
+    nu : fréquence (Hz)
+    sigma : écart-type de la raie gaussienne (T)
+    nuclei : liste de Nucleus (couplage hyperfin isotrope)
+    lineshape : Lineshape, remplace la gaussienne sigma
+    orientations, chunk, max_workers : voir powder_histogram
+    histogram : histogramme déjà calculé par powder_histogram sur la même
+        grille B ; seule la convolution par la raie est alors refaite
+    """
+    f, N, dB = fft_grid(B)
+    if histogram is None:
+        histogram = powder_histogram(B, g_tensor, nu, orientations, chunk, max_workers)
+    return convolve_histogram(histogram, B, N, dB, sigma, nuclei, derivative, lineshape)
+
+if __name__=='__main__':
+    import matplotlib.pyplot as plt
+
+    # Anion radical du naphtalène : 4 H (a=0.495 mT) et 4 H (a=0.187 mT)
+    nuclei = [Nucleus(I=0.5, a=0.495e-3, n=4), Nucleus(I=0.5, a=0.187e-3, n=4)]
+    B_res = 0.335
+    B = np.arange(B_res-0.004, B_res+0.004, 2e-6)
+    positions, weights = stick_spectrum(B_res, nuclei)
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(8, 6))
+    ax1.vlines(positions, 0, weights, color='grey', label='Stick spectrum')
+    ax1.set_ylabel('Intensity')
+    ax1.legend()
+    ax2.plot(B, hyperfine_spectrum(B, B_res, nuclei, sigma=3e-5, derivative=True), color='red', label='First derivative signal')
+    ax2.set_xlabel('$B_0$ $\\mathrm{(T)}$')
+    ax2.legend()
+    plt.show()
@@ -11,6 +11,7 @@ This code is under licence CC-BY-NC-SA. It enables you to reuse the code by ment
 import matplotlib.pyplot as plt
 import numpy as np
 import widgets
+import titration
 import scipy.constants as constants
 from matplotlib import rc
 
@@ -46,6 +47,9 @@ A=1e-5 #electrode area (m²)
 V_Fe2=10 #titrated volume (mL)
 V0=10 #total volume (mL)
 
+#Titration curve determination
+E0_interpolation=False #True: linear interpolation between two E grid columns, False: E grid column reached by E0
+
 ## Modulated parameters
 
 parameters = {'V' : widgets.FloatSlider(value=0.000001, description='$V$ $\mathrm{(mL)}$', min=0.00000001, max=20),
@@ -55,122 +59,32 @@ parameters = {'V' : widgets.FloatSlider(value=0.000001, description='$V$ $\mathr
 ### Functions ###
 #################
 
-# Titration volume determination
-def Veq(c0_Fe2,c0_Ce4,V_Fe2):
-    return c0_Fe2*V_Fe2/c0_Ce4
-
-# Fe2+ concentration as a function of the added volume V
-def c_Fe2(V,Veq): 
-    if V<=Veq:
-        return (c0_Fe2*V_Fe2-c0_Ce4*V)/(V0)
-    else:
-        return 0.0000000001 # non-zero value due to a divergent behaviour
-
-# Fe3+ concentration as a function of the added volume V
-def c_Fe3(V,Veq):
-    if V<Veq:
-        return c0_Ce4*V/(V0)
-    else:
-        return c0_Ce4*Veq/(V0)
-    
-# Ce4+ concentration as a function of the added volume V
-def c_Ce4(V,Veq):
-    if V<Veq:
-        return 0.0000000001
-    else:
-        return c0_Ce4*(V-Veq)/(V0)
-
-# Ce3+ concentration as a function of the added volume V    
-def c_Ce3(V,Veq):
-    if V<Veq:
-        return c0_Ce4*V/(V0)
-    else:
-        return c0_Ce4*Veq/(V0)
-
-#Anodic diffusive controlled current
-def i_a(delta,Cred,Dred):
-  return n*F*A*Dred*Cred/delta
-
-#Cathodic diffusive controlled current
-def i_c(delta,Cox,Dox):
-  return -n*F*A*Dox*Cox/delta
-
-#Diffusion-limited current
-def i_diff(delta,Dred,Dox,Cred,Cox,E,E_std):
-    ia=i_a(delta,Cred,Dred)
-    ic=i_c(delta,Cox,Dox)
-    k=(E-E_std)*(n*F)/(R*T)
-    return (np.exp(k)*ia+ic)/(1+np.exp(k))
-
-#i-E Fe data at the added volume V:
-def iE_data_Fe(V,Veq,E):
-    #Concentration calculation
-    Fe2=c_Fe2(V,Veq)
-    Fe3=c_Fe3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Fe=i_diff(delta,D_Fe2,D_Fe3,Fe2,Fe3,E,E_std_Fe)
-
-    return i_diff_Fe
+#Titration model (computations shared by the titration scripts)
+model=titration.Titration(F=F,R=R,T=T,
+                          E_std_Ce=E_std_Ce,D_Ce3=D_Ce3,D_Ce4=D_Ce4,c0_Ce4=c0_Ce4,
+                          E_std_Fe=E_std_Fe,D_Fe3=D_Fe3,D_Fe2=D_Fe2,c0_Fe2=c0_Fe2,
+                          delta=delta,n=n,A=A,V_Fe2=V_Fe2,V0=V0)
 
-#i-E data at the added volume V:
-def iE_data_Ce(V,Veq,E):
-    #Concentration calculation
-    Ce4=c_Ce4(V,Veq)
-    Ce3=c_Ce3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Ce=i_diff(delta,D_Ce3,D_Ce4,Ce3,Ce4,E,E_std_Ce)
-
-    
-    return i_diff_Ce
-
-#i-E data at the added volume V:
-def iE_data_tot(V,Veq,E):
-    #Concentration calculation
-    Fe2=c_Fe2(V,Veq)
-    Fe3=c_Fe3(V,Veq)
-    Ce4=c_Ce4(V,Veq)
-    Ce3=c_Ce3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Fe=i_diff(delta,D_Fe2,D_Fe3,Fe2,Fe3,E,E_std_Fe)
-    i_diff_Ce=i_diff(delta,D_Ce3,D_Ce4,Ce3,Ce4,E,E_std_Ce)
-    i_diff_tot=i_diff_Fe+i_diff_Ce
-    
-    return i_diff_tot
-
-#Titration spot
-def titration_Eminus(V):
-    i=iE_data_tot(V,Veq,E)
-    counter=0
-    for k in range(0,len(i)):
-        if i[k]<-i0:
-            counter=counter+1
-    return E[counter]
-
-def titration_Epositive(V):
-    i=iE_data_tot(V,Veq,E)
-    counter=0
-    for k in range(0,len(i)):
-        if i[k]<i0:
-            counter=counter+1
-    return E[counter]
+#V x E current surface, computed once and reused for every E0
+#(call update_surface again after changing the model constants)
+def update_surface():
+    global iE_surface,V_surface
+    V_surface=V_domain
+    iE_surface=model.surface(V_surface,E)
+    return iE_surface
 
 def titration_i(V,E0):
-    counter=0
-    for k in range(0,len(E)):
-        if E[k]<E0:
-            counter=counter+1
-    return iE_data_tot(V,Veq,E)[counter]
+    return titration.current_at_E0(model.iE_data_tot(V,E),E,E0,E0_interpolation)
 
 
-#Titration curve
+#Titration curve: column of the precomputed current surface
+#(computed again for a volume grid other than the one of the surface)
 def titration_curve(V_domain,E0):
-    i_titr=[]
-    for v in V_domain:
-        i_titr.append(titration_i(v,E0))
-    return i_titr
+    if V_domain is V_surface or np.array_equal(V_domain,V_surface):
+        iE=iE_surface
+    else:
+        iE=model.surface(V_domain,E)
+    return titration.current_at_E0(iE,E,E0,E0_interpolation)
 
 
 
@@ -180,15 +94,18 @@ def titration_curve(V_domain,E0):
 
 # This function is called when the sliders are changed 
 def plot_data(V,E0):
-    lines['$i_\mathrm{Fe}$'].set_data(E,iE_data_Fe(V,Veq,E))
-    lines['$i_\mathrm{Ce}$'].set_data(E,iE_data_Ce(V,Veq,E))
-    lines['$i_\mathrm{tot}$'].set_data(E,iE_data_tot(V,Veq,E))
+    i_tot=model.iE_data_tot(V,E)
+    i_spot=titration.current_at_E0(i_tot,E,E0,E0_interpolation)
+    if choose_widget.visible['$i_\mathrm{Fe}$']:
+        lines['$i_\mathrm{Fe}$'].set_data(E,model.iE_data_Fe(V,E))
+    if choose_widget.visible['$i_\mathrm{Ce}$']:
+        lines['$i_\mathrm{Ce}$'].set_data(E,model.iE_data_Ce(V,E))
+    lines['$i_\mathrm{tot}$'].set_data(E,i_tot)
     lines['$E_0$'].set_data([E0,E0],[-3e-7,3e-7])
     lines['$Titration \ curve$'].set_data(V_domain,titration_curve(V_domain,E0))
-    lines['$Titration \ spot \ (left)$'].set_data(E0,titration_i(V,E0))   
-    lines['$Titration \ spot \ (right)$'].set_data(V,titration_i(V,E0))  
+    lines['$Titration \ spot \ (left)$'].set_data(E0,i_spot)   
+    lines['$Titration \ spot \ (right)$'].set_data(V,i_spot)  
     
-    fig.canvas.draw_idle()
 
 
 #===========================================================
@@ -201,12 +118,14 @@ fig=plt.figure(figsize=(18,6))
 fig.suptitle(r'Amperometric titration $(E=E_0)$  of a $\mathbf{Fe^{2+}}$ solution by a $\mathbf{Ce^{4+}}$ solution',weight='bold')
 
 
-Veq=Veq(c0_Fe2,c0_Ce4,V_Fe2)
+Veq=model.Veq()
 
 
 E=np.arange(0.0001,2.001,0.0211)
 V_domain=np.arange(0.0000001,2*Veq+0.00001,0.02)
 
+iE_surface=update_surface()
+
 
 
 fig.text(0.01,0.9,r'Titration conditions', multialignment='left', verticalalignment='top',weight='bold')
@@ -275,8 +194,9 @@ ax2.legend()
 
 
 
-param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05])
-choose_widget = widgets.make_choose_plot(lines, box=[0.01,0.2,0.12, 0.2])
+level_of_detail = widgets.LevelOfDetail(lines.values())
+choose_widget = widgets.make_choose_plot(lines, box=[0.01,0.2,0.12, 0.2], on_change=lambda visible: param_widgets.refresh())
+param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05], max_fps=30, blit=list(lines.values()))
 reset_button = widgets.make_reset_button(param_widgets,box=[0.85, 0.05, 0.10, 0.05])
 
 if __name__=='__main__':
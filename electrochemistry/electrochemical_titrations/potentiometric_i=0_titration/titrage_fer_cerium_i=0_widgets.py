@@ -5,13 +5,14 @@
 Python code provided as is.
 Made by Vincent Wieczny, from Chemistry Department, ENS de Lyon, France
 This code is under licence CC-BY-NC-SA. It enables you to reuse the code by mentioning the orginal author and without making profit from it.
-This code is using widgets.py that you need to download in the same diretory as the main Python file.
+This code is using widgets.py and titration.py that you need to download in the same diretory as the main Python file.
 """
 
 #Librairies
 import matplotlib.pyplot as plt
 import numpy as np
 import widgets
+import titration
 import scipy.constants as constants
 from matplotlib import rc
 
@@ -48,6 +49,15 @@ A=1e-5 #electrode area (m²)
 V_Fe2=10 #titrated volume (mL)
 V0=10 #total volume (mL)
 
+#Titration spot determination
+solver='grid' #'grid': first non-negative current on the E grid, 'root': bracketed root finding
+E_tol=1e-6 #potential tolerance of the root finding (V)
+max_iter=100 #maximal number of root finding iterations
+
+#Titration curve sampling
+adaptive_V=False #True: adaptive volume grid refined around the equivalence point, False: V_domain
+curve_tol=1e-3 #largest potential gap between the adaptive curve and its chords (V)
+
 ## Modulated parameters
 
 parameters = {'V' : widgets.FloatSlider(value=0.000001, description='$V$ $\mathrm{(mL)}$', min=0.00000001, max=20)}
@@ -56,107 +66,39 @@ parameters = {'V' : widgets.FloatSlider(value=0.000001, description='$V$ $\mathr
 ### Functions ###
 #################
 
-# Titration volume determination
-def Veq(c0_Fe2,c0_Ce4,V_Fe2):
-    return c0_Fe2*V_Fe2/c0_Ce4
-
-# Fe2+ concentration as a function of the added volume V
-def c_Fe2(V,Veq): 
-    if V<=Veq:
-        return (c0_Fe2*V_Fe2-c0_Ce4*V)/(V0)
-    else:
-        return 0.0000000001 # non-zero value due to a divergent behaviour
-
-# Fe3+ concentration as a function of the added volume V
-def c_Fe3(V,Veq):
-    if V<Veq:
-        return c0_Ce4*V/(V0)
-    else:
-        return c0_Ce4*Veq/(V0)
-    
-# Ce4+ concentration as a function of the added volume V
-def c_Ce4(V,Veq):
-    if V<Veq:
-        return 0.0000000001
-    else:
-        return c0_Ce4*(V-Veq)/(V0)
-
-# Ce3+ concentration as a function of the added volume V    
-def c_Ce3(V,Veq):
-    if V<Veq:
-        return c0_Ce4*V/(V0)
-    else:
-        return c0_Ce4*Veq/(V0)
-
-#Anodic diffusive controlled current
-def i_a(delta,Cred,Dred):
-  return n*F*A*Dred*Cred/delta
-
-#Cathodic diffusive controlled current
-def i_c(delta,Cox,Dox):
-  return -n*F*A*Dox*Cox/delta
-
-#Diffusion-limited current
-def i_diff(delta,Dred,Dox,Cred,Cox,E,E_std):
-    ia=i_a(delta,Cred,Dred)
-    ic=i_c(delta,Cox,Dox)
-    k=(E-E_std)*(n*F)/(R*T)
-    return (np.exp(k)*ia+ic)/(1+np.exp(k))
-
-#i-E Fe data at the added volume V:
-def iE_data_Fe(V,Veq,E):
-    #Concentration calculation
-    Fe2=c_Fe2(V,Veq)
-    Fe3=c_Fe3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Fe=i_diff(delta,D_Fe2,D_Fe3,Fe2,Fe3,E,E_std_Fe)
-
-    return i_diff_Fe
-
-#i-E data at the added volume V:
-def iE_data_Ce(V,Veq,E):
-    #Concentration calculation
-    Ce4=c_Ce4(V,Veq)
-    Ce3=c_Ce3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Ce=i_diff(delta,D_Ce3,D_Ce4,Ce3,Ce4,E,E_std_Ce)
-
-    
-    return i_diff_Ce
-
-#i-E data at the added volume V:
-def iE_data_tot(V,Veq,E):
-    #Concentration calculation
-    Fe2=c_Fe2(V,Veq)
-    Fe3=c_Fe3(V,Veq)
-    Ce4=c_Ce4(V,Veq)
-    Ce3=c_Ce3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Fe=i_diff(delta,D_Fe2,D_Fe3,Fe2,Fe3,E,E_std_Fe)
-    i_diff_Ce=i_diff(delta,D_Ce3,D_Ce4,Ce3,Ce4,E,E_std_Ce)
-    i_diff_tot=i_diff_Fe+i_diff_Ce
-    
-    return i_diff_tot
+#Titration model (computations shared by the titration scripts)
+model=titration.Titration(F=F,R=R,T=T,
+                          E_std_Ce=E_std_Ce,D_Ce3=D_Ce3,D_Ce4=D_Ce4,c0_Ce4=c0_Ce4,
+                          E_std_Fe=E_std_Fe,D_Fe3=D_Fe3,D_Fe2=D_Fe2,c0_Fe2=c0_Fe2,
+                          delta=delta,n=n,A=A,V_Fe2=V_Fe2,V0=V0)
+
+#Root finding iterations (solver='root'): of each spot of the last call, and largest so far
+root_iterations=None
+root_iterations_max=0
+
+#Titration spots for an array of added volumes
+def titration_spots(V_domain):
+    global root_iterations,root_iterations_max
+    if solver=='root':
+        E_spots,root_iterations=model.zero_current_root(V_domain,E.min(),E.max(),E_tol,max_iter)
+        root_iterations_max=max(root_iterations_max,int(np.max(root_iterations)))
+        return E_spots
+    return titration.observables(model,V_domain,E)['E_zero']
 
 #Titration spot
 def titration_spot(V):
-    i=iE_data_tot(V,Veq,E)
-    counter=0
-    for k in range(0,len(i)):
-        if i[k]<0:
-            counter=counter+1
-    return E[counter]
+    return titration_spots(V)[0]
 
 #Titration curve
 def titration_curve(V_domain):
-    E_titr=[]
-    for v in V_domain:
-        E_titr.append(titration_spot(v))
-    return E_titr
+    return titration_spots(V_domain)
 
+#Titration curve data (volumes and potentials), on V_domain or adaptively sampled
+def titration_curve_data():
+    if adaptive_V:
+        V_adaptive,E_titr,n_eval=titration.adaptive_grid(titration_spots,V_domain.min(),V_domain.max(),tol=curve_tol)
+        return V_adaptive,E_titr
+    return V_domain,titration_curve(V_domain)
 
 
 
@@ -172,11 +114,15 @@ fig=plt.figure(figsize=(18,6))
 fig.suptitle(r'Potentiometric titration $(i=0)$  of a $\mathbf{Fe^{2+}}$ solution by a $\mathbf{Ce^{4+}}$ solution',weight='bold')
 
 
-Veq=Veq(c0_Fe2,c0_Ce4,V_Fe2)
+Veq=model.Veq()
 
 E=np.arange(0.0001,2.001,0.0011)
 V_domain=np.arange(0.0000001,2*Veq+0.00001,0.01)
 
+#Titration curve and end point detected on it (the divergent start is left out)
+V_curve,titration_curve_0=titration_curve_data()
+Veq_curve=titration.find_endpoints(V_curve,titration_curve_0,order=1,window=(0.05*V_domain.max(),V_domain.max()))
+
 
 
 fig.text(0.01,0.9,r'Titration conditions', multialignment='left', verticalalignment='top',weight='bold')
@@ -186,7 +132,11 @@ fig.text(0.01,0.77,r'$V_0=${:.2f} mL'.format(V_Fe2), multialignment='left', vert
 fig.text(0.01,0.72,r'Titrant solution', multialignment='left', verticalalignment='top')
 fig.text(0.01,0.67,r'$c_1=${:.3f} mol/L'.format(c0_Ce4), multialignment='left', verticalalignment='top')
 fig.text(0.01,0.62,r'End point', multialignment='left', verticalalignment='top')
-fig.text(0.01,0.57,r'$V_e=${:.2f} mL'.format(Veq), multialignment='left', verticalalignment='top')
+fig.text(0.01,0.57,r'$V_e=${:.2f} mL (curve: {:.2f} mL)'.format(Veq,Veq_curve), multialignment='left', verticalalignment='top')
+if solver=='root':
+    fig.text(0.01,0.52,r'Root finding: {} iterations max'.format(root_iterations_max), multialignment='left', verticalalignment='top')
+else:
+    fig.text(0.01,0.52,r'Grid search: $\Delta E=${:.4f} V'.format(E[1]-E[0]), multialignment='left', verticalalignment='top')
 fig.text(0.01,0.47,r'Dilution is not taken into account.', multialignment='left', verticalalignment='top')
 
 
@@ -228,22 +178,31 @@ ax2.set_ylabel('$E$ $\mathrm{(V/ESH)}$')
 
 spot_list_V=[]
 spot_list_E=[]
-titration_curve_0=titration_curve(V_domain)
-
 
 
-# This function is called when the sliders are changed 
-def plot_data(V):
-    spot_list_V.append(V)
-    spot_list_E.append(titration_spot(V))
-    lines['$i_\mathrm{Fe}$'].set_data(E,iE_data_Fe(V,Veq,E))
-    lines['$i_\mathrm{Ce}$'].set_data(E,iE_data_Ce(V,Veq,E))
-    lines['$i_\mathrm{tot}$'].set_data(E,iE_data_tot(V,Veq,E))
+# Numerical part of the slider callback, run by a background worker
+# (the hidden curves are not computed: None)
+def compute_data(V):
+    E_spot=titration_spot(V)
+    curves={}
+    for key,iE_data in [('$i_\mathrm{Fe}$',model.iE_data_Fe),('$i_\mathrm{Ce}$',model.iE_data_Ce),('$i_\mathrm{tot}$',model.iE_data_tot)]:
+        curves[key]=iE_data(V,E) if choose_widget.visible[key] else None
+    return E_spot,curves
+
+# This function is called with the result of compute_data when the sliders are changed 
+def plot_data(result,V):
+    E_spot,curves=result
+    #a new spot only when the volume changes (not when a curve is shown again)
+    if not spot_list_V or spot_list_V[-1]!=V:
+        spot_list_V.append(V)
+        spot_list_E.append(E_spot)
+    for key,i_data in curves.items():
+        if i_data is not None:
+            lines[key].set_data(E,i_data)
     lines['$Titration \ step \ by \ step$'].set_data(spot_list_V,spot_list_E)
-    lines['$Titration \ curve$'].set_data(V_domain,titration_curve_0)
-    truc['$Titration \ spot \ (left)$'].set_data(titration_spot(V),0)
-    truc['$Titration \ spot \ (right)$'].set_data(V,titration_spot(V))
-    fig.canvas.draw_idle()
+    lines['$Titration \ curve$'].set_data(V_curve,titration_curve_0)
+    truc['$Titration \ spot \ (left)$'].set_data(E_spot,0)
+    truc['$Titration \ spot \ (right)$'].set_data(V,E_spot)
 
 
 #########################
@@ -253,7 +212,7 @@ lines['$i_\mathrm{Fe}$'], = ax1.plot([], [],color='green',lw=2,label='$i_\mathrm
 lines['$i_\mathrm{Ce}$'], = ax1.plot([], [],color='blue',lw=2,label='$i_\mathrm{Ce}$')
 lines['$i_\mathrm{tot}$'], = ax1.plot([], [], lw=3, color='red',label='$i_\mathrm{tot}$')
 lines['$Titration \ step \ by \ step$'],=ax2.plot([],[],'o',color='black',lw=1)
-lines['$Titration \ curve$'],=ax2.plot(V_domain,titration_curve_0,color='red',lw=3,label='$Titration \ curve$')
+lines['$Titration \ curve$'],=ax2.plot(V_curve,titration_curve_0,color='red',lw=3,label='$Titration \ curve$')
 truc={}
 truc['$Titration \ spot \ (left)$'], = ax1.plot([], [],'o',color='black',lw=2,label='$Titration \ spot$')
 truc['$Titration \ spot \ (right)$'], = ax2.plot([], [],'o',color='black',lw=2,label='$Titration \ spot$')
@@ -263,8 +222,9 @@ ax1.legend()
 
 ax2.legend()
 
-param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05])
-choose_widget = widgets.make_choose_plot(lines, box=[0.01,0.2,0.12, 0.2])
+level_of_detail = widgets.LevelOfDetail(lines.values())
+choose_widget = widgets.make_choose_plot(lines, box=[0.01,0.2,0.12, 0.2], on_change=lambda visible: param_widgets.refresh())
+param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05], max_fps=30, compute=compute_data, worker='thread', blit=list(lines.values())+list(truc.values()))
 reset_button = widgets.make_reset_button(param_widgets,box=[0.85, 0.05, 0.10, 0.05])
 
 if __name__=='__main__':
@@ -0,0 +1,649 @@
+# -*- coding: utf-8 -*-
+"""
+Python code provided as is.
+Made by Vincent Wieczny, from Chemistry Department, ENS de Lyon, France
+This code is under licence CC-BY-NC-SA. It enables you to reuse the code by mentioning the orginal author and without making profit from it.
+"""
+
+""" Programmes communs aux scripts de titrage Fe2+/Ce4+
+Une class Titration qui enregistre les constantes du modèle (même
+syntaxe que les widgets : Titration(c0_Fe2=2e-3, ...)) et calcule
+la spéciation et les courants de diffusion sur des tableaux de V et E.
+Une class MultiTitration généralise le modèle à un nombre quelconque
+de couples rédox (RedoxCouple) titrés successivement par un titrant.
+Les trois observables des titrages se lisent sur la même surface
+courant-potentiel (une ligne par volume V, E sur le dernier axe) :
+    zero_current_potential (i=0),
+    crossing_potentials (i=+/-i0),
+    current_at_E0 (E=E0)
+La fonction observables les calcule toutes en une seule évaluation
+de la surface.
+La fonction run_sweep balaye un produit cartésien de paramètres sur
+plusieurs processus et enregistre les courbes et les points
+équivalents par blocs sur le disque (reprise possible) :
+    python titration.py sweep_dir --c0_Fe2 5e-4 1.5e-3 11 --i0 1e-9 1e-8 4
+Les points équivalents du balayage sont contrôlés par :
+    python titration.py --check
+"""
+
+import os
+import json
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+
+class Parameters(object):
+    def __init__(self, **kwd):
+        for key, val in kwd.items():
+            if not hasattr(type(self), key):
+                raise Exception('Attribut "{}" non valide'.format(key))
+            setattr(self, key, val)
+
+
+class Model(Parameters):
+    """ Common part of the titration models, built on iE_data_tot(V, E) """
+
+    def surface(self, V_domain, E):
+        """ V x E current surface, one row per added volume """
+        V_domain = np.atleast_1d(V_domain)
+        return self.iE_data_tot(V_domain[:, np.newaxis], E)
+
+    def zero_current_root(self, V_domain, E_min, E_max, E_tol=1e-6, max_iter=100):
+        """ Zero-current potential by bracketed root finding
+        The zero of the total current is bracketed in [E_min, E_max] and refined
+        for all volumes at once with the Illinois variant of the regula falsi.
+        Returns the potentials, known to E_tol, and the iterations of each point.
+        """
+        V_domain = np.atleast_1d(V_domain)
+        a = np.full(len(V_domain), E_min, dtype=float)
+        b = np.full(len(V_domain), E_max, dtype=float)
+        fa = self.iE_data_tot(V_domain, a)
+        fb = self.iE_data_tot(V_domain, b)
+        E_root = np.where(np.abs(fa)<np.abs(fb), a, b)
+        iterations = np.zeros(len(V_domain), dtype=int)
+
+        #Iterations on the points which are bracketed and not yet converged
+        active = np.flatnonzero((fa*fb<0) & (np.abs(b-a)>E_tol))
+        for _ in range(max_iter):
+            if len(active)==0:
+                break
+            a_k, b_k, fa_k, fb_k = a[active], b[active], fa[active], fb[active]
+
+            #Regula falsi step
+            c = b_k-fb_k*(b_k-a_k)/(fb_k-fa_k)
+            fc = self.iE_data_tot(V_domain[active], c)
+
+            #Bracket update (Illinois: halve the value of the retained end point)
+            change = fc*fb_k<0
+            a_k = np.where(change, b_k, a_k)
+            fa_k = np.where(change, fb_k, 0.5*fa_k)
+            a[active], fa[active] = a_k, fa_k
+            b[active], fb[active] = c, fc
+            E_root[active] = c
+            iterations[active] += 1
+
+            converged = (np.abs(c-a_k)<=E_tol) | (fc==0)
+            active = active[~converged]
+
+        return E_root, iterations
+
+    def n_couples(self):
+        """ Number of redox couples, i.e. of current terms per point of the surface """
+        return 2
+
+
+class Titration(Model):
+    #Physical constants
+    F = 96500.0 #Faraday number (C/mol)
+    R = 8.314 #Gas constant (J/K/mol)
+    T = 298.0 #Temperature (K)
+
+    #Ce4+/Ce3+
+    E_std_Ce = 1.44 #standard potential (V/SHE)
+    D_Ce3 = 1e-9
+    D_Ce4 = 1e-9
+    c0_Ce4 = 1e-3 #titrant concentration (mol/L)
+
+    #Fe3+/Fe2+
+    E_std_Fe = 0.77 #standard potential (V/SHE)
+    D_Fe3 = 1e-9
+    D_Fe2 = 1e-9
+    c0_Fe2 = 1e-3 #titrated concentration (mol/L)
+
+    #Electrochemical setup and system
+    delta = 1e-5 #diffuse layer thickness (m)
+    n = 1 #number of exchanged electrons
+    A = 1e-5 #electrode area (m²)
+
+    #Titration parameters
+    V_Fe2 = 10 #titrated volume (mL)
+    V0 = 10 #total volume (mL)
+
+    c_min = 1e-10 #non-zero value of the vanishing species, due to a divergent behaviour
+
+    def Veq(self):
+        """ Titration volume """
+        return self.c0_Fe2*self.V_Fe2/self.c0_Ce4
+
+    def speciation(self, V):
+        """ Fe2+, Fe3+, Ce4+ and Ce3+ concentrations for an array of added volumes V
+        The titration parameters may also be arrays, broadcast against V.
+        """
+        V = np.asarray(V, dtype=float)
+        c0_Fe2, c0_Ce4, V0 = self.c0_Fe2, self.c0_Ce4, self.V0
+        V_e = self.Veq()
+        Fe2 = np.where(V<=V_e, (c0_Fe2*self.V_Fe2-c0_Ce4*V)/V0, self.c_min)
+        Fe3 = np.where(V<V_e, c0_Ce4*V/V0, c0_Ce4*V_e/V0)
+        Ce4 = np.where(V<V_e, self.c_min, c0_Ce4*(V-V_e)/V0)
+        Ce3 = np.where(V<V_e, c0_Ce4*V/V0, c0_Ce4*V_e/V0)
+        return Fe2, Fe3, Ce4, Ce3
+
+    def i_diff(self, Dred, Dox, Cred, Cox, E, E_std):
+        """ Diffusion-limited current of one couple """
+        ia = self.n*self.F*self.A*Dred*Cred/self.delta
+        ic = -self.n*self.F*self.A*Dox*Cox/self.delta
+        k = np.exp((E-E_std)*(self.n*self.F)/(self.R*self.T))
+        return (k*ia+ic)/(1+k)
+
+    def iE_data_Fe(self, V, E):
+        """ Fe3+/Fe2+ current, V and E broadcast together """
+        Fe2, Fe3, Ce4, Ce3 = self.speciation(V)
+        return self.i_diff(self.D_Fe2, self.D_Fe3, Fe2, Fe3, E, self.E_std_Fe)
+
+    def iE_data_Ce(self, V, E):
+        """ Ce4+/Ce3+ current, V and E broadcast together """
+        Fe2, Fe3, Ce4, Ce3 = self.speciation(V)
+        return self.i_diff(self.D_Ce3, self.D_Ce4, Ce3, Ce4, E, self.E_std_Ce)
+
+    def iE_data_tot(self, V, E):
+        """ Total current, V and E broadcast together """
+        Fe2, Fe3, Ce4, Ce3 = self.speciation(V)
+        i_diff_Fe = self.i_diff(self.D_Fe2, self.D_Fe3, Fe2, Fe3, E, self.E_std_Fe)
+        i_diff_Ce = self.i_diff(self.D_Ce3, self.D_Ce4, Ce3, Ce4, E, self.E_std_Ce)
+        return i_diff_Fe+i_diff_Ce
+
+    def as_multi(self):
+        """ Same titration, as a MultiTitration with two couples """
+        Fe = RedoxCouple(name='Fe', E_std=self.E_std_Fe, n=self.n, D_ox=self.D_Fe3, D_red=self.D_Fe2, c0=self.c0_Fe2)
+        Ce = RedoxCouple(name='Ce', E_std=self.E_std_Ce, n=self.n, D_ox=self.D_Ce4, D_red=self.D_Ce3, c0=self.c0_Ce4)
+        return MultiTitration(F=self.F, R=self.R, T=self.T, delta=self.delta, A=self.A,
+                              V_analyte=self.V_Fe2, V0=self.V0, c_min=self.c_min,
+                              analytes=[Fe], titrant=Ce)
+
+
+class RedoxCouple(Parameters):
+    name = ""
+    E_std = 0.0 #standard potential (V/SHE)
+    n = 1 #number of exchanged electrons
+    D_ox = 1e-9 #oxidant diffusion coefficient (m2/s)
+    D_red = 1e-9 #reductant diffusion coefficient (m2/s)
+    c0 = 1e-3 #concentration of the titrated reductant, or of the titrant oxidant (mol/L)
+    stoichiometry = 1 #moles of titrant consumed per mole of titrated reductant
+
+
+class MultiTitration(Model):
+    """ Titration of several reductants (analytes) by one oxidant (titrant)
+    The analytes are oxidized one after the other, by increasing standard
+    potential. All the couples are stacked along a leading axis, so that the
+    currents of any number of couples are computed without Python loops.
+    """
+    #Physical constants
+    F = 96500.0 #Faraday number (C/mol)
+    R = 8.314 #Gas constant (J/K/mol)
+    T = 298.0 #Temperature (K)
+
+    #Electrochemical setup
+    delta = 1e-5 #diffuse layer thickness (m)
+    A = 1e-5 #electrode area (m²)
+
+    #Titration parameters
+    V_analyte = 10 #titrated volume (mL)
+    V0 = 10 #total volume (mL)
+
+    #Redox couples
+    analytes = () #RedoxCouple list of the titrated reductants
+    titrant = None #RedoxCouple of the titrant oxidant
+
+    c_min = 1e-10 #non-zero value of the vanishing species, due to a divergent behaviour
+
+    def __init__(self, **kwd):
+        Parameters.__init__(self, **kwd)
+        if self.titrant is None:
+            raise ValueError('MultiTitration needs a titrant (RedoxCouple of the titrant oxidant)')
+        if len(self.analytes)==0:
+            raise ValueError('MultiTitration needs at least one analyte (RedoxCouple list of the titrated reductants)')
+        for couple in list(self.analytes)+[self.titrant]:
+            if couple.c0<=0:
+                raise ValueError('Couple "{}" needs a positive concentration c0'.format(couple.name))
+        #Analytes sorted once by increasing standard potential, then the titrant
+        self.sorted_couples = sorted(self.analytes, key=lambda couple: couple.E_std)+[self.titrant]
+
+    def couples(self):
+        """ Analytes sorted by increasing standard potential, then the titrant """
+        return self.sorted_couples
+
+    def n_couples(self):
+        return len(self.sorted_couples)
+
+    def stack(self, key):
+        """ Array of one attribute of all the couples (same order as couples) """
+        return np.array([getattr(couple, key) for couple in self.couples()], dtype=float)
+
+    def Veq(self):
+        """ Successive equivalence volumes, one per analyte """
+        c0 = self.stack('c0')
+        stoichiometry = self.stack('stoichiometry')
+        return np.cumsum(c0[:-1]*stoichiometry[:-1]*self.V_analyte/c0[-1])
+
+    def speciation(self, V):
+        """ Oxidant and reductant concentrations for an array of added volumes V
+        Returns two arrays of shape (number of couples,)+V.shape.
+        """
+        V = np.asarray(V, dtype=float)
+        expand = (slice(None),)+(np.newaxis,)*V.ndim
+        c0 = self.stack('c0')
+        V_e = self.Veq()
+        V_start = np.concatenate([[0], V_e[:-1]])
+
+        #Analytes: fraction oxidized between the previous and the next equivalence
+        c_tot = (c0[:-1]*self.V_analyte/self.V0)[expand]
+        oxidized = np.clip((V-V_start[expand])/(V_e-V_start)[expand], 0, 1)
+        c_red = np.where(V<=V_e[expand], c_tot*(1-oxidized), self.c_min)
+        c_ox = c_tot*oxidized
+
+        #Titrant: reduced up to the last equivalence, in excess afterwards
+        c_titrant = c0[-1]
+        V_last = V_e[-1]
+        titrant_red = c_titrant*np.minimum(V, V_last)/self.V0
+        titrant_ox = np.where(V<V_last, self.c_min, c_titrant*(V-V_last)/self.V0)
+
+        c_ox = np.concatenate([c_ox, titrant_ox[np.newaxis]])
+        c_red = np.concatenate([c_red, titrant_red[np.newaxis]])
+        return c_ox, c_red
+
+    def iE_data(self, V, E):
+        """ Current of each couple, shape (number of couples,)+broadcast(V, E) """
+        c_ox, c_red = self.speciation(V)
+        shape = np.broadcast(np.empty(np.shape(V)), np.empty(np.shape(E))).shape
+        expand = (slice(None),)+(np.newaxis,)*len(shape)
+        c_ox = c_ox.reshape(c_ox.shape[:1]+(1,)*(len(shape)-np.ndim(V))+np.shape(V))
+        c_red = c_red.reshape(c_ox.shape)
+        n = self.stack('n')[expand]
+        ia = n*self.F*self.A*self.stack('D_red')[expand]*c_red/self.delta
+        ic = -n*self.F*self.A*self.stack('D_ox')[expand]*c_ox/self.delta
+        k = np.exp((E-self.stack('E_std')[expand])*(n*self.F)/(self.R*self.T))
+        return (k*ia+ic)/(1+k)
+
+    def iE_data_tot(self, V, E):
+        """ Total current, V and E broadcast together """
+        return self.iE_data(V, E).sum(axis=0)
+
+
+def zero_current_potential(i, E):
+    """ Potential at i=0 read on i-E data (E along the last axis)
+    The current increases with E: the zero-current potential is the first E
+    where the current is no longer negative, i.e. the number of negative values.
+    """
+    counter = np.count_nonzero(i<0, axis=-1)
+    return E[np.minimum(counter, len(E)-1)]
+
+def crossing_potentials(i, E, i0):
+    """ E(-i0), E(+i0) and Delta E read on i-E data (E along the last axis)
+    i0 may be an array of currents: the results then get a leading i0 axis,
+    which gives a whole family of Delta E curves from a single current matrix.
+    """
+    i0 = np.asarray(i0)[(...,)+(np.newaxis,)*np.ndim(i)]
+    Eminus = E[np.minimum(np.count_nonzero(i<-i0, axis=-1), len(E)-1)]
+    Epositive = E[np.minimum(np.count_nonzero(i<i0, axis=-1), len(E)-1)]
+    return Eminus, Epositive, Epositive-Eminus
+
+def current_at_E0(i, E, E0, interpolate=False):
+    """ Current at E0 read on i-E data (E along the last axis)
+    Without interpolation, the first E grid point which is not below E0 is used.
+    """
+    counter = min(np.searchsorted(E, E0), len(E)-1)
+    if not interpolate or counter==0 or E[counter]<=E0:
+        return i[..., counter]
+    w = (E0-E[counter-1])/(E[counter]-E[counter-1])
+    return (1-w)*i[..., counter-1]+w*i[..., counter]
+
+def observables(model, V_domain, E, i0=None, E0=None, interpolate=False, block=512):
+    """ Observables of the three detection modes from one surface evaluation
+    model : Titration or MultiTitration instance
+    V_domain, E : volume and potential grids
+    i0 : current (or array of currents) of the i=i0 mode, skipped if None
+    E0 : potential of the E=E0 mode, skipped if None
+    block : number of (volume, couple) rows per surface block, to bound the
+        memory footprint: each block holds block//model.n_couples() volumes
+    Returns a dictionary with 'E_zero', and 'E_minus', 'E_positive', 'DeltaE'
+    (if i0 is given) and 'i_E0' (if E0 is given), one value per volume.
+    """
+    V_domain = np.atleast_1d(V_domain)
+    block = max(1, block//model.n_couples())
+    blocks = []
+    for start in range(0, len(V_domain), block):
+        i = model.surface(V_domain[start:start+block], E)
+        out = {'E_zero':zero_current_potential(i, E)}
+        if i0 is not None:
+            out['E_minus'], out['E_positive'], out['DeltaE'] = crossing_potentials(i, E, i0)
+        if E0 is not None:
+            out['i_E0'] = current_at_E0(i, E, E0, interpolate)
+        blocks.append(out)
+    return {key:np.concatenate([out[key] for out in blocks], axis=-1) for key in blocks[0]}
+
+def adaptive_grid(f, V_min, V_max, n_init=21, tol=None, max_depth=12):
+    """ Adaptive sampling of a titration curve
+    f : vectorized function, one value per volume of an array of volumes
+    V_min, V_max : bounds of the volume domain
+    n_init : number of evenly spaced volumes of the coarse starting grid
+    tol : largest accepted gap between the curve and the chord of an interval,
+        by default 1/1000 of the spread of the coarse curve
+    max_depth : largest number of subdivisions of a coarse interval
+    Each interval is split in two while its midpoint differs from the chord by
+    more than tol, so that the points gather where the curve bends, around
+    the equivalence point. All the midpoints of one level are evaluated in
+    one call of f. Returns the volumes, the values and the number of calls
+    of f per volume (the number of evaluated points).
+    """
+    V = np.linspace(V_min, V_max, n_init)
+    y = np.asarray(f(V), dtype=float)
+    if tol is None:
+        tol = 1e-3*np.ptp(y)
+    V_all, y_all = [V], [y]
+    a, b, ya, yb = V[:-1], V[1:], y[:-1], y[1:]
+    for _ in range(max_depth):
+        if len(a)==0:
+            break
+        m = 0.5*(a+b)
+        ym = np.asarray(f(m), dtype=float)
+        V_all.append(m)
+        y_all.append(ym)
+        split = np.abs(ym-0.5*(ya+yb))>tol
+        a, b, ya, yb, m, ym = a[split], b[split], ya[split], yb[split], m[split], ym[split]
+        a, b, ya, yb = np.concatenate([a, m]), np.concatenate([m, b]), np.concatenate([ya, ym]), np.concatenate([ym, yb])
+    V, y = np.concatenate(V_all), np.concatenate(y_all)
+    order = np.argsort(V)
+    return V[order], y[order], len(V)
+
+def derivative(V, y):
+    """ First derivative of curves along their last axis, on any volume grid
+    V : volumes, broadcast against y (one shared grid or one grid per curve)
+    Second order finite differences inside, first order at both ends.
+    """
+    V = np.broadcast_to(V, np.shape(y))
+    hl = V[..., 1:-1]-V[..., :-2]
+    hr = V[..., 2:]-V[..., 1:-1]
+    inside = (hl**2*y[..., 2:]-hr**2*y[..., :-2]+(hr**2-hl**2)*y[..., 1:-1])/(hl*hr*(hl+hr))
+    first = (y[..., 1:2]-y[..., :1])/(V[..., 1:2]-V[..., :1])
+    last = (y[..., -1:]-y[..., -2:-1])/(V[..., -1:]-V[..., -2:-1])
+    return np.concatenate([first, inside, last], axis=-1)
+
+def find_endpoints(V, curves, order=1, window=None, skip_start=False):
+    """ Equivalence volumes detected on titration curves
+    V : volumes, one shared grid (n_V,) or one grid per curve
+    curves : one curve (n_V,) or stacked curves (n_curves, n_V)
+    order : 0 for the maximum of the curve (Delta E of the i=i0 mode),
+        1 for the steepest point (potential of the i=0 mode),
+        2 for the sharpest break (current of the E=E0 mode)
+    window : (V_min, V_max) volume range of the search, None for all volumes,
+        e.g. to leave out the divergent start of the titration
+    skip_start : True to leave out the hill that starts at the first grid
+        point (the Delta E plateau of the divergent start), up to the first
+        strict local minimum of the signal
+    Among the strict local maxima of the curve (order 0) or of the absolute
+    value of its derivative of that order, the largest one is kept. A flat
+    run (values equal up to rounding errors) counts as one maximum only if it
+    is strictly above the points on both sides; runs reaching an end of the
+    curve do not count, nor runs whose neighbours are outside the window.
+    The volume is then the vertex of the least-squares parabola through the
+    top of the peak: the points within three quantization steps (smallest
+    non-zero difference of the signal) of the maximum, at least the maximum
+    and its two neighbours. Curves read on a potential grid are staircases
+    whose top spans many steps, and the whole top is fitted instead of its
+    middle sample. Curves without a strict local maximum in the window (flat
+    or monotonic signal), or whose top reaches V[0] or V[-1], get NaN.
+    """
+    curves = np.asarray(curves, dtype=float)
+    V = np.broadcast_to(V, curves.shape)
+    signal = curves
+    for _ in range(order):
+        signal = derivative(V, signal)
+    if order>0:
+        signal = np.abs(signal)
+
+    #Flat runs: first and last index of the run of equal values of each point
+    #(equal up to rounding errors)
+    n = curves.shape[-1]
+    index = np.broadcast_to(np.arange(n), curves.shape)
+    jump = np.abs(np.diff(signal, axis=-1))
+    tol = 1e-9*np.max(np.abs(signal), axis=-1, keepdims=True)
+    step = np.ones(curves.shape, dtype=bool)
+    step[..., 1:] = jump>tol
+    first = np.maximum.accumulate(np.where(step, index, 0), axis=-1)
+    step_after = np.ones(curves.shape, dtype=bool)
+    step_after[..., :-1] = step[..., 1:]
+    last = n-1-np.maximum.accumulate(np.where(step_after, n-1-index, 0)[..., ::-1], axis=-1)[..., ::-1]
+
+    #Largest strict local maximum (middle of its run) and its two neighbours
+    before = np.take_along_axis(signal, np.maximum(first-1, 0), axis=-1)
+    after = np.take_along_axis(signal, np.minimum(last+1, n-1), axis=-1)
+    peak = (first>0) & (last<n-1) & (signal>before) & (signal>after) & (index==(first+last)//2)
+    if window is not None:
+        inside = (V>=window[0]) & (V<=window[1])
+        peak &= np.take_along_axis(inside, np.maximum(first-1, 0), axis=-1)
+        peak &= np.take_along_axis(inside, np.minimum(last+1, n-1), axis=-1)
+    if skip_start:
+        valley = (first>0) & (last<n-1) & (signal<before) & (signal<after)
+        peak &= index>np.min(np.where(valley, index, n), axis=-1, keepdims=True)
+    found = peak.any(axis=-1)
+    k = np.argmax(np.where(peak, signal, -np.inf), axis=-1)[..., np.newaxis]
+    top = np.take_along_axis(signal, k, axis=-1)
+
+    #Top of the peak: the points around k within a few quantization steps
+    #(smallest non-zero difference of the signal) of the maximum, at least k
+    #and its two neighbours
+    quantum = np.min(np.where(jump>tol, jump, np.inf), axis=-1, keepdims=True)
+    high = (signal>=top-3*quantum) | (np.abs(index-k)<=1)
+    if window is not None:
+        high &= inside
+    low_before = np.where(~high & (index<k), index, -1).max(axis=-1)
+    low_after = np.where(~high & (index>k), index, n).min(axis=-1)
+    region = (index>low_before[..., np.newaxis]) & (index<low_after[..., np.newaxis])
+    #a top reaching V[0] or V[-1] is not a maximum
+    found &= (low_before>=0) & (low_after<=n-1)
+
+    #Vertex of the least-squares parabola through the top (on the middle of
+    #the top if the parabola is not concave)
+    x = np.where(region, V-np.take_along_axis(V, k, axis=-1), 0)
+    y = np.where(region, signal-top, 0)
+    w = region.astype(float)
+    S = [np.sum(w*x**p, axis=-1) for p in range(5)]
+    matrix = np.stack([np.stack([S[4-r], S[3-r], S[2-r]], axis=-1) for r in range(3)], axis=-2)
+    #(curves without a maximum get a solvable dummy system)
+    matrix = np.where(found[..., np.newaxis, np.newaxis], matrix, np.eye(3))
+    rhs = np.stack([np.sum(x**2*y, axis=-1), np.sum(x*y, axis=-1), np.sum(y, axis=-1)], axis=-1)
+    a, b, c = np.moveaxis(np.linalg.solve(matrix, rhs[..., np.newaxis])[..., 0], -1, 0)
+    x_min = np.min(np.where(region, x, np.inf), axis=-1)
+    x_max = np.max(np.where(region, x, -np.inf), axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vertex = np.where(a<0, -b/(2*a), 0.5*(x_min+x_max))
+    vertex = np.clip(vertex, x_min, x_max)
+    vertex = vertex+np.take_along_axis(V, k, axis=-1)[..., 0]
+    return np.where(found, vertex, np.nan)
+
+
+def sweep_window(model, window=None):
+    """ Volume range of the end point search for one parameter set
+    window : None for 0.5 to 1.5 times the analytic equivalence volume of
+        the model, or a fixed (V_min, V_max) range
+    """
+    if window is None:
+        Veq = model.Veq()
+        return (0.5*Veq, 1.5*Veq)
+    return tuple(window)
+
+def sweep_chunk(path, index, names, values, V_domain, E, base, i0=None, window=None):
+    """ Titration curves and end points of one chunk of parameter sets
+    i0 : None or array of the currents of the i=i0 mode, all read on the
+        surface of each parameter set
+    window : volume range of the end point search (see sweep_window); the
+        hill of the divergent start is always left out
+    Written to path/chunk_<index>.npz (renamed once complete).
+    """
+    Veq = np.empty(len(values))
+    Veq_zero = np.empty(len(values))
+    E_zero = np.empty((len(values), len(V_domain)))
+    if i0 is None:
+        DeltaE = np.full((len(values), len(V_domain)), np.nan)
+    else:
+        DeltaE = np.empty((len(values), len(i0), len(V_domain)))
+    Veq_DeltaE = np.full(DeltaE.shape[:-1], np.nan)
+    for k, row in enumerate(values):
+        kwd = dict(base)
+        kwd.update(zip(names, row))
+        model = Titration(**kwd)
+        out = observables(model, V_domain, E, i0=i0)
+        Veq[k] = model.Veq()
+        E_zero[k] = out['E_zero']
+        search = sweep_window(model, window)
+        Veq_zero[k] = find_endpoints(V_domain, E_zero[k], order=1, window=search, skip_start=True)
+        if i0 is not None:
+            DeltaE[k] = out['DeltaE']
+            Veq_DeltaE[k] = find_endpoints(V_domain, DeltaE[k], order=0, window=search, skip_start=True)
+    filename = os.path.join(path, 'chunk_{:06d}.npz'.format(index))
+    with open(filename+'.tmp', 'wb') as tmp:
+        np.savez(tmp, parameters=values, E_zero=E_zero, DeltaE=DeltaE, Veq=Veq,
+                 Veq_zero=Veq_zero, Veq_DeltaE=Veq_DeltaE)
+    os.replace(filename+'.tmp', filename)
+    return index
+
+def run_sweep(path, ranges, V_domain, E, chunk_size=16, max_workers=None, window=None, **base):
+    """ Parameter sweep of the titration, split over a process pool
+    path : directory of the sweep (manifest sweep.json and chunk_*.npz files)
+    ranges : dictionary {parameter name: values}, Titration attributes or 'i0'
+    V_domain, E : volume and potential grids
+    chunk_size : number of parameter sets per chunk file
+    max_workers : number of processes (all the cores by default)
+    window : volume range of the end point search, by default 0.5 to 1.5
+        times the analytic equivalence volume of each parameter set (see
+        sweep_window)
+    base : other Titration attributes (or a single 'i0'), common to all the
+        parameter sets
+    The Cartesian product of the ranges of the Titration attributes is cut
+    into chunks computed by the pool. The i0 values are not part of the
+    product: the whole family is read on the surface of each parameter set,
+    so that DeltaE gets an i0 axis (parameter sets, i0, volumes). Without
+    i0, DeltaE and Veq_DeltaE hold NaN. Chunks already on disk are skipped,
+    so that an interrupted sweep is resumed by calling run_sweep again with
+    the same arguments. The analytic equivalence volumes are returned with
+    the detected ones (Veq); end points not found (NaN) are reported.
+    """
+    base = {name:float(val) for name, val in base.items()}
+    i0 = ranges.get('i0', base.pop('i0', None))
+    if i0 is not None:
+        i0 = np.atleast_1d(np.asarray(i0, dtype=float))
+    names = [name for name in ranges if name!='i0']
+    for name in names+list(base):
+        if not hasattr(Titration, name):
+            raise Exception('Attribut "{}" non valide'.format(name))
+    grid = np.array(list(itertools.product(*[np.asarray(ranges[name], dtype=float) for name in names])))
+    grid = grid.reshape(len(grid), len(names))
+    V_domain, E = np.asarray(V_domain, dtype=float), np.asarray(E, dtype=float)
+    manifest = {'names':names, 'ranges':{name:np.asarray(ranges[name], dtype=float).tolist() for name in names},
+                'i0':None if i0 is None else i0.tolist(), 'base':base,
+                'V_domain':V_domain.tolist(), 'E':E.tolist(), 'chunk_size':chunk_size,
+                'window':None if window is None else [float(val) for val in window]}
+
+    #Manifest of the sweep, checked when an existing sweep is resumed
+    os.makedirs(path, exist_ok=True)
+    manifest_file = os.path.join(path, 'sweep.json')
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            if json.load(f)!=manifest:
+                raise Exception('{} holds a different sweep'.format(path))
+    else:
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f)
+
+    n_chunks = (len(grid)+chunk_size-1)//chunk_size
+    todo = [index for index in range(n_chunks)
+            if not os.path.exists(os.path.join(path, 'chunk_{:06d}.npz'.format(index)))]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        jobs = [pool.submit(sweep_chunk, path, index, names, grid[index*chunk_size:(index+1)*chunk_size],
+                            V_domain, E, base, i0, window) for index in todo]
+        for job in as_completed(jobs):
+            job.result()
+    data = load_sweep(path)
+    for key in ['Veq_zero', 'Veq_DeltaE']:
+        missing = np.isnan(data[key]).sum()
+        if missing and not (key=='Veq_DeltaE' and i0 is None):
+            print('{}: {} end points not found (NaN)'.format(key, missing))
+    return data
+
+def load_sweep(path):
+    """ Arrays of a sweep directory, chunks concatenated in order """
+    with open(os.path.join(path, 'sweep.json')) as f:
+        manifest = json.load(f)
+    chunks = sorted(name for name in os.listdir(path) if name.startswith('chunk_') and name.endswith('.npz'))
+    data = {}
+    for name in chunks:
+        with np.load(os.path.join(path, name)) as chunk:
+            for key in chunk.files:
+                data.setdefault(key, []).append(chunk[key])
+    data = {key:np.concatenate(val) for key, val in data.items()}
+    data['names'] = manifest['names']
+    data['i0'] = None if manifest['i0'] is None else np.array(manifest['i0'])
+    data['V_domain'] = np.array(manifest['V_domain'])
+    data['E'] = np.array(manifest['E'])
+    return data
+
+def check():
+    """ Regression checks of the sweep end points (python titration.py --check)
+    c0_Fe2=1.5e-3 with i0=1e-8 on the default 0-20 mL grid: the Delta E
+    plateau of the divergent start reaches past 1 mL, its edge must not be
+    taken for the end point (15 mL).
+    """
+    V_domain = np.arange(0.0000001, 2*Titration().Veq()+0.00001, 0.01)
+    E = np.arange(0.0001, 2.001, 0.0011)
+    with tempfile.TemporaryDirectory() as path:
+        data = run_sweep(path, {'c0_Fe2':[1e-3, 1.5e-3], 'i0':[1e-9, 1e-8]}, V_domain, E, max_workers=1)
+    for Veq, Veq_zero, Veq_DeltaE in zip(data['Veq'], data['Veq_zero'], data['Veq_DeltaE']):
+        if not abs(Veq_zero-Veq)<0.05 or not np.all(np.abs(Veq_DeltaE-Veq)<0.2):
+            raise Exception('End points {}, {} for Veq={}'.format(Veq_zero, Veq_DeltaE, Veq))
+    print('ok')
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Parameter sweep of the Fe2+/Ce4+ titration')
+    parser.add_argument('path', nargs='?', help='sweep directory (resumed if it exists)')
+    for name in ['c0_Fe2', 'c0_Ce4', 'delta', 'D_Fe2', 'D_Fe3', 'D_Ce3', 'D_Ce4', 'i0']:
+        parser.add_argument('--'+name, nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'))
+    parser.add_argument('--V_max', type=float, default=None, help='largest added volume (mL), twice the default Veq by default')
+    parser.add_argument('--V_step', type=float, default=0.01, help='volume step (mL)')
+    parser.add_argument('--chunk_size', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--window', nargs=2, type=float, default=None, metavar=('V_MIN', 'V_MAX'),
+                        help='volume range of the end point search (mL), 0.5 to 1.5 times Veq by default')
+    parser.add_argument('--check', action='store_true', help='run the regression checks of the end points')
+    args = parser.parse_args()
+    if args.check:
+        check()
+        raise SystemExit
+    if args.path is None:
+        parser.error('the sweep directory is required')
+
+    ranges = {}
+    for name in ['c0_Fe2', 'c0_Ce4', 'delta', 'D_Fe2', 'D_Fe3', 'D_Ce3', 'D_Ce4', 'i0']:
+        bounds = getattr(args, name)
+        if bounds is not None:
+            ranges[name] = np.linspace(bounds[0], bounds[1], int(bounds[2]))
+    V_max = args.V_max if args.V_max is not None else 2*Titration().Veq()
+    V_domain = np.arange(0.0000001, V_max+0.00001, args.V_step)
+    E = np.arange(0.0001, 2.001, 0.0011)
+    data = run_sweep(args.path, ranges, V_domain, E, chunk_size=args.chunk_size, max_workers=args.workers,
+                     window=args.window)
+    print('{} parameter sets in {}'.format(len(data['parameters']), args.path))
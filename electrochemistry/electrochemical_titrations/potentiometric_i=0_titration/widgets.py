@@ -11,6 +11,17 @@ d'enregistrer des paramètres avant de créer le widget. La
 syntaxe est la même que les ipywidgets. Ceci permet entre
 autre de mettre de séparer le fond (les parmètres) de la forme
 (l'axe), ce que matplotlib ne permet pas.
+Une class Throttle qui limite le nombre de mises à jour par seconde.
+Une class BackgroundWorker qui exécute les calculs hors de l'interface.
+Une class Blitter qui ne redessine que les courbes modifiées.
+Une class Graph qui ne recalcule que les grandeurs dont les paramètres
+ont changé.
+Une class LookupTable qui précalcule les résultats sur une grille de
+valeurs des sliders.
+Une class Profiler qui mesure les callbacks (activée par la variable
+d'environnement WIDGETS_PROFILE=1 ou WIDGETS_PROFILE=cprofile).
+Une class LevelOfDetail qui réduit les courbes denses à la résolution
+de l'écran.
 Des fonctions : 
     make_param_widgets, 
     make_choose_plot, 
@@ -19,7 +30,23 @@ Des fonctions :
     make_start_stop_animation
 """
 
+import os
+import time
+import atexit
+import cProfile
+import pstats
+import inspect
+import itertools
+import traceback
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.backend_bases import TimerBase
+from matplotlib.transforms import Bbox
+from matplotlib.lines import Line2D
 from matplotlib.widgets import Slider, Button, RadioButtons, CheckButtons
 
 class Widget(object):
@@ -63,42 +90,640 @@ class IntSlider(Widget):
 slider_color = 'lightgoldenrodyellow'
 
 
-def make_param_widgets(parameters, plot_data, slider_box):
+class Graph(object):
+    """ Graphe de dépendances des grandeurs calculées
+    parameters : dictionnaire des paramètres (Widget ou valeurs initiales)
+    Chaque grandeur est déclarée avec le décorateur node : le nom des
+    arguments de la fonction donne ses dépendances (paramètres ou autres
+    grandeurs). update(**values) invalide uniquement les grandeurs qui
+    dépendent, directement ou non, des paramètres modifiés ; graph[name]
+    renvoie la valeur mémorisée ou la recalcule.
+
+    graph = Graph(parameters)
+    @graph.node
+    def curve(DeltaB):
+        return signal(B, DeltaB)
+    graph.update(B0=0.2, DeltaB=0.05)
+    graph['curve']
+    """
+    def __init__(self, parameters={}):
+        self.values = {}
+        for key, val in parameters.items():
+            if isinstance(val, Widget):
+                val = val.value
+            self.values[key] = val
+        self.nodes = {}
+        self.cache = {}
+
+    def node(self, function):
+        self.nodes[function.__name__] = (function, list(inspect.signature(function).parameters))
+        return function
+
+    def update(self, **values):
+        changed = set()
+        for key, val in values.items():
+            if key not in self.values or self.values[key]!=val:
+                changed.add(key)
+            self.values[key] = val
+        self.invalidate(changed)
+        return changed
+
+    def invalidate(self, names):
+        stale = set(names)
+        done = False
+        while not done:
+            done = True
+            for name, (function, args) in self.nodes.items():
+                if name not in stale and stale.intersection(args):
+                    stale.add(name)
+                    done = False
+        for name in stale:
+            self.cache.pop(name, None)
+
+    def __getitem__(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.cache:
+            function, args = self.nodes[name]
+            self.cache[name] = function(*[self[arg] for arg in args])
+        return self.cache[name]
+
+
+def main_process():
+    """ False dans un processus d'un pool : avec la méthode spawn (Windows,
+    macOS), ces processus réimportent le script, qui ne doit pas y lancer
+    de nouveau pool """
+    # parent_process() n'est pas encore connu pendant la réimportation
+    return multiprocessing.current_process().name=='MainProcess'
+
+
+def table_chunk(compute, names, axes, value):
+    """ Calcule une tranche de la table (premier paramètre fixé à value) """
+    out = []
+    for point in itertools.product(*axes):
+        values = dict(zip(names, (value,)+point))
+        out.append(np.asarray(compute(**values), dtype=np.float32))
+    return np.array(out)
+
+
+class LookupTable(object):
+    """ Table des résultats de compute sur une grille de valeurs des sliders
+    parameters : dictionnaire des paramètres (FloatSlider, IntSlider)
+    compute : fonction compute(**values) qui renvoie un tableau de forme
+        fixe ; elle est envoyée aux processus et doit donc être définie au
+        niveau d'un module
+    steps : nombre de points de la grille pour chaque FloatSlider (les
+        IntSlider prennent toutes les valeurs entières)
+    La table (float32) est calculée en arrière-plan par un pool de
+    processus dès start() (sauf dans un processus d'un pool, voir
+    main_process). Tant qu'elle n'est pas prête, table(**values) appelle
+    compute ; ensuite la valeur est interpolée (multilinéaire) pour les
+    FloatSlider et lue directement pour les IntSlider.
+    Mode optionnel, activé par make_param_widgets(..., compute=compute,
+    table=steps) ; les scripts du dépôt ne l'utilisent pas (leurs calculs
+    sont assez rapides), il est destiné aux modèles lourds :
+    param_widgets = make_param_widgets(parameters, plot_data, slider_box,
+                                       compute=compute, table=41)
+    """
+    def __init__(self, parameters, compute, steps=21, max_workers=None):
+        if compute is None:
+            raise Exception('LookupTable demande une fonction compute')
+        self.compute = compute
+        self.names = list(parameters)
+        self.axes = []
+        self.interpolate = []
+        for key, w in parameters.items():
+            if isinstance(w, IntSlider):
+                self.axes.append(np.arange(w.min, w.max+1))
+                self.interpolate.append(False)
+            else:
+                self.axes.append(np.linspace(w.min, w.max, steps))
+                self.interpolate.append(True)
+        self.max_workers = max_workers
+        self.futures = None
+        self.table = None
+        self.timer = None
+        self.on_ready = None
+
+    def start(self, canvas=None, on_ready=None):
+        """ Lance le calcul de la table
+        on_ready : fonction appelée (sans argument) dans la boucle
+            d'événements de canvas quand la table est prête, par exemple
+            pour redessiner la figure avec les valeurs interpolées
+        """
+        if not main_process():
+            return
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.futures = [executor.submit(table_chunk, self.compute, self.names, self.axes[1:], value)
+                        for value in self.axes[0]]
+        executor.shutdown(wait=False)
+        if canvas is not None and on_ready is not None:
+            timer = canvas.new_timer(interval=100)
+            if type(timer) is not TimerBase:
+                self.on_ready = on_ready
+                self.timer = timer
+                self.timer.add_callback(self.poll)
+                self.timer.start()
+
+    def poll(self):
+        if self.futures is None:
+            self.timer.stop()
+        elif self.ready():
+            self.timer.stop()
+            self.on_ready()
+
+    def ready(self):
+        if self.table is None and self.futures is not None:
+            if all(future.done() for future in self.futures):
+                for future in self.futures:
+                    error = future.exception()
+                    if error is not None:
+                        # la table est abandonnée, compute reste utilisée
+                        traceback.print_exception(type(error), error, error.__traceback__)
+                        self.futures = None
+                        return False
+                chunks = [future.result() for future in self.futures]
+                shape = tuple(len(axis) for axis in self.axes)
+                self.table = np.array(chunks).reshape(shape+chunks[0].shape[1:])
+                self.futures = None
+        return self.table is not None
+
+    def __call__(self, **values):
+        if not self.ready():
+            return self.compute(**values)
+        corners = [((), 1.)]
+        for key, axis, interpolate in zip(self.names, self.axes, self.interpolate):
+            x = values[key]
+            if not interpolate or len(axis)==1:
+                i = int(np.clip(np.rint(x-axis[0]), 0, len(axis)-1))
+                corners = [(index+(i,), weight) for index, weight in corners]
+                continue
+            i = int(np.clip(np.searchsorted(axis, x, 'right')-1, 0, len(axis)-2))
+            u = min(max((x-axis[i])/(axis[i+1]-axis[i]), 0.), 1.)
+            corners = ([(index+(i,), weight*(1-u)) for index, weight in corners]+
+                       [(index+(i+1,), weight*u) for index, weight in corners])
+        return sum(weight*self.table[index] for index, weight in corners if weight)
+
+
+def profile_mode(profile=None):
+    """ Renvoie None, 'time' ou 'cprofile'
+    profile : None : valeur de la variable d'environnement WIDGETS_PROFILE
+    """
+    if profile is None:
+        profile = os.environ.get('WIDGETS_PROFILE', '')
+    if profile in ('', '0', False):
+        return None
+    if profile=='cprofile':
+        return 'cprofile'
+    return 'time'
+
+
+class Profiler(object):
+    """ Mesure des callbacks
+    fig : figure où sont affichés les temps de calcul et de dessin (dernier
+        et moyenne glissante sur window événements)
+    cprofile : si True, les callbacks sont aussi profilés par cProfile
+    Les dessins complets de la figure sont chronométrés automatiquement ;
+    wrap(function) chronomètre un callback (plot_data, update...). À la
+    sortie du programme, un résumé et les top fonctions les plus
+    coûteuses sont affichés.
+    """
+    def __init__(self, fig, cprofile=False, window=20, top=15):
+        self.recent = {'compute': deque(maxlen=window), 'draw': deque(maxlen=window)}
+        self.times = {'compute': [], 'draw': []}
+        self.top = top
+        self.profile = cProfile.Profile() if cprofile else None
+        self.text = fig.text(0.995, 0.005, '', ha='right', va='bottom',
+                             fontsize=8, family='monospace', color='grey')
+        draw = fig.draw
+
+        def timed_draw(renderer):
+            t0 = time.perf_counter()
+            draw(renderer)
+            self.add('draw', time.perf_counter()-t0)
+
+        fig.draw = timed_draw
+        atexit.register(self.dump)
+
+    def wrap(self, function, key='compute'):
+        def timed(*args, **kwd):
+            t0 = time.perf_counter()
+            if self.profile is not None and key=='compute':
+                self.profile.enable()
+            try:
+                return function(*args, **kwd)
+            finally:
+                if self.profile is not None and key=='compute':
+                    self.profile.disable()
+                self.add(key, time.perf_counter()-t0)
+                if key=='compute':
+                    self.show()
+        return timed
+
+    def add(self, key, dt):
+        self.recent[key].append(1e3*dt)
+        self.times[key].append(1e3*dt)
+
+    def show(self):
+        # pas appelée pendant un dessin : modifier le texte relancerait un dessin
+        lines = []
+        for key in ['compute', 'draw']:
+            if self.recent[key]:
+                lines.append('{} {:7.1f} ms (moy. {:7.1f})'.format(key, self.recent[key][-1], np.mean(self.recent[key])))
+        self.text.set_text('\n'.join(lines))
+
+    def dump(self):
+        for key in ['compute', 'draw']:
+            times = self.times[key]
+            if times:
+                print('{} : {} appels, médiane {:.1f} ms, max {:.1f} ms'.format(key, len(times), np.median(times), np.max(times)))
+        if self.profile is not None:
+            pstats.Stats(self.profile).sort_stats('cumulative').print_stats(self.top)
+
+
+class Throttle(object):
+    """ Regroupe les demandes de mise à jour
+    callback : fonction appelée (sans argument)
+    max_fps : None : callback est appelée à chaque demande
+        sinon : au plus max_fps appels par seconde. Une demande reçue
+        pendant l'intervalle est mise en attente et les demandes en
+        attente sont fusionnées en un seul appel à la fin de l'intervalle.
+    Sans boucle d'événements (backend non interactif, ex. Agg), les
+    demandes sont traitées immédiatement.
+    """
+    def __init__(self, canvas, callback, max_fps=None):
+        self.callback = callback
+        self.pending = False
+        self.waiting = False
+        self.timer = None
+        if max_fps:
+            timer = canvas.new_timer(interval=max(1, int(1000/max_fps)))
+            if type(timer) is not TimerBase:
+                timer.single_shot = True
+                timer.add_callback(self.tick)
+                self.timer = timer
+
+    def request(self):
+        if self.timer is None:
+            self.callback()
+        elif self.waiting:
+            self.pending = True
+        else:
+            self.run()
+
+    def run(self):
+        self.pending = False
+        self.waiting = True
+        try:
+            self.callback()
+        finally:
+            self.timer.start()
+
+    def tick(self):
+        self.waiting = False
+        if self.pending:
+            self.run()
+
+
+class BackgroundWorker(object):
+    """ Exécute compute(**values) dans un thread ou un processus
+    compute : fonction de calcul (sans matplotlib)
+    apply : fonction apply(result, values) appelée dans la boucle
+        d'événements de l'interface
+    worker : 'thread' ou 'process' (compute doit alors être définie au
+        niveau d'un module ; dans un processus d'un pool, voir main_process,
+        un thread est utilisé)
+    Chaque soumission reçoit un numéro de génération : un calcul pas encore
+    commencé est annulé par la soumission suivante et le résultat d'une
+    génération dépassée est ignoré. Une erreur de compute est affichée
+    une seule fois et le calcul est abandonné. Sans boucle d'événements
+    (backend non interactif, ex. Agg), le résultat est attendu et appliqué
+    aussitôt.
+    """
+    def __init__(self, canvas, compute, apply, worker='thread'):
+        self.compute = compute
+        self.apply = apply
+        if worker=='process' and main_process():
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.generation = 0
+        self.jobs = []
+        self.timer = canvas.new_timer(interval=20)
+        if type(self.timer) is TimerBase:
+            self.timer = None
+        else:
+            self.timer.add_callback(self.poll)
+
+    def submit(self, values):
+        self.generation += 1
+        for generation, job_values, future in self.jobs:
+            future.cancel()
+        future = self.executor.submit(self.compute, **values)
+        self.jobs.append((self.generation, values, future))
+        if self.timer is None:
+            wait([future])
+            self.poll()
+        else:
+            self.timer.start()
+
+    def poll(self):
+        # les calculs terminés sont retirés avant de lire leur résultat :
+        # une erreur n'est pas relue au tick suivant
+        running = []
+        finished = []
+        for job in self.jobs:
+            (finished if job[2].done() else running).append(job)
+        self.jobs = running
+        if not running and self.timer is not None:
+            self.timer.stop()
+        for generation, values, future in finished:
+            if generation!=self.generation or future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                traceback.print_exception(type(error), error, error.__traceback__)
+                continue
+            self.apply(future.result(), values)
+
+
+class Blitter(object):
+    """ Rendu par blitting
+    artists : artistes redessinés à chaque mise à jour (les autres,
+        axes, textes, lignes de référence, forment le fond)
+    axes : axes redessinés entièrement à chaque mise à jour (ex. sliders)
+    Les légendes des axes des artistes (créées avant le Blitter) sont
+    redessinées après eux : elles restent au-dessus des courbes et leur
+    position loc='best' tient compte des courbes, comme avec draw_idle.
+    Le fond des axes concernés est mémorisé à chaque dessin complet de la
+    figure (premier affichage, redimensionnement, changement d'échelle...) ;
+    le reste de la figure (boutons...) n'est pas touché. Sans boucle
+    d'événements (backend non interactif, ex. Agg) ou sans support du
+    blitting, update revient à draw_idle.
+    """
+    def __init__(self, canvas, artists, axes=()):
+        self.canvas = canvas
+        self.artists = list(artists)
+        self.axes = list(axes)
+        self.background = None
+        self.plot_axes = []
+        for artist in self.artists:
+            if artist.axes not in self.plot_axes + self.axes:
+                self.plot_axes.append(artist.axes)
+        self.legends = [ax.get_legend() for ax in self.plot_axes if ax.get_legend() is not None]
+        self.active = (canvas.supports_blit and
+                       type(canvas.new_timer()) is not TimerBase)
+        if self.active:
+            for artist in self.artists+self.legends:
+                artist.set_animated(True)
+            canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        fig = self.canvas.figure
+        bboxes = [ax.bbox.frozen() for ax in self.plot_axes]
+        for ax in self.axes:
+            # la valeur affichée à droite du slider change de largeur
+            bbox = ax.get_tightbbox(event.renderer)
+            bboxes.append(Bbox.from_extents(bbox.x0, bbox.y0, fig.bbox.x1, bbox.y1))
+        self.background = [(bbox, self.canvas.copy_from_bbox(bbox)) for bbox in bboxes]
+        self.draw_artists()
+
+    def draw_artists(self):
+        fig = self.canvas.figure
+        for ax in self.axes:
+            fig.draw_artist(ax)
+        for artist in self.artists+self.legends:
+            fig.draw_artist(artist)
+
+    def update(self):
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        for bbox, region in self.background:
+            self.canvas.restore_region(region)
+        self.draw_artists()
+        for bbox, region in self.background:
+            self.canvas.blit(bbox)
+
+
+def minmax_decimate(x, y, x_min, x_max, n_buckets, log=False):
+    """ Réduit la courbe (x, y), x croissant, à n_buckets intervalles sur
+    [x_min, x_max] : dans chaque intervalle on garde le premier et le
+    dernier point, le minimum et le maximum de y (la forme de la courbe à
+    l'écran est conservée). Les points hors de la fenêtre sont retirés,
+    sauf un de chaque côté pour que la courbe sorte de l'axe.
+    """
+    start = max(np.searchsorted(x, x_min, 'left')-1, 0)
+    stop = min(np.searchsorted(x, x_max, 'right')+1, len(x))
+    x = x[start:stop]
+    y = y[start:stop]
+    if len(x)<=4*n_buckets:
+        return x, y
+    u = np.log10(np.clip(x, 1e-300, None)) if log else x
+    u_min, u_max = u[0], u[-1]
+    if not u_max>u_min:
+        return x, y
+    bucket = np.minimum(((u-u_min)/(u_max-u_min)*n_buckets).astype(int), n_buckets-1)
+    # x croissant : chaque intervalle est une tranche contiguë
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:]!=bucket[:-1])))
+    counts = np.diff(np.concatenate((starts, [len(x)])))
+    segment = np.repeat(np.arange(len(starts)), counts)
+    keep = [starts, starts+counts-1]
+    for reduce in [np.fmin, np.fmax]:
+        extremum = np.flatnonzero(y==np.repeat(reduce.reduceat(y, starts), counts))
+        keep.append(extremum[np.unique(segment[extremum], return_index=True)[1]])
+    keep = np.unique(np.concatenate(keep))
+    return x[keep], y[keep]
+
+
+class LevelOfDetail(object):
+    """ Sous-échantillonnage des courbes à la largeur de l'axe en pixels
+    lines : liste de Line2D
+    Les méthodes set_data, set_xdata et set_ydata de ces lignes gardent les
+    données complètes et n'affichent que leur réduction (minmax_decimate,
+    4 points au plus par colonne de pixels). Sur un zoom (xlim_changed) ou
+    un redimensionnement de la figure, les courbes sont réduites à nouveau
+    à partir des données complètes : la résolution du calcul ne change
+    plus le coût du dessin. Les courbes dont x n'est pas croissant sont
+    affichées telles quelles.
+    """
+    def __init__(self, lines):
+        self.data = {}
+        canvases = []
+        for line in lines:
+            self.data[line] = (line.get_xdata(), line.get_ydata())
+            line.set_data = self.make_setter(line, 'data')
+            line.set_xdata = self.make_setter(line, 'x')
+            line.set_ydata = self.make_setter(line, 'y')
+            line.axes.callbacks.connect('xlim_changed', self.on_xlim)
+            if line.figure.canvas not in canvases:
+                canvases.append(line.figure.canvas)
+                line.figure.canvas.mpl_connect('resize_event', self.on_resize)
+            self.decimate(line)
+
+    def make_setter(self, line, which):
+        def setter(*args):
+            x, y = self.data[line]
+            if which=='data':
+                x, y = args if len(args)==2 else args[0]
+            elif which=='x':
+                x = args[0]
+            else:
+                y = args[0]
+            self.data[line] = (x, y)
+            self.decimate(line)
+        return setter
+
+    def decimate(self, line):
+        x, y = self.data[line]
+        xd, yd = x, y
+        if np.ndim(x)==1 and np.ndim(y)==1 and len(x)==len(y):
+            x_array = np.asarray(x, dtype=float)
+            if len(x_array)>1 and np.all(np.diff(x_array)>=0):
+                ax = line.axes
+                x_min, x_max = sorted(ax.get_xlim())
+                if ax.get_autoscalex_on():
+                    # les limites suivront les données : pas de fenêtre
+                    x_min, x_max = x_array[0], x_array[-1]
+                n_buckets = max(int(ax.bbox.width), 1)
+                xd, yd = minmax_decimate(x_array, np.asarray(y, dtype=float), x_min, x_max,
+                                         n_buckets, ax.get_xscale()=='log')
+        # méthodes de la classe : celles de la ligne sont remplacées
+        Line2D.set_xdata(line, xd)
+        Line2D.set_ydata(line, yd)
+
+    def on_xlim(self, ax):
+        for line in self.data:
+            if line.axes is ax:
+                self.decimate(line)
+
+    def on_resize(self, event):
+        for line in self.data:
+            self.decimate(line)
+
+
+class ParamWidgets(dict):
+    """ Dictionnaire des sliders matplotlib renvoyé par make_param_widgets
+    refresh() relance plot_data avec les valeurs actuelles des sliders
+    (les arguments sont ignorés : refresh peut servir de callback, par
+    exemple on_change de make_choose_plot)
+    """
+    request = None
+
+    def refresh(self, *args):
+        self.request()
+
+
+def make_param_widgets(parameters, plot_data, slider_box, max_fps=None, compute=None, worker='thread', blit=None, table=None, profile=None):
     """ Crée automatiquement les widget matplotlib
     parameters : dictionnaire contenant les parameters
     plot_data : callback fonction
     slider_box : boite dans laquelle mettre les sliders
+    max_fps : None (par défaut) : plot_data est appelée à chaque événement
+        sinon : nombre maximal d'appels de plot_data par seconde ; les
+        événements reçus entre deux appels sont fusionnés et seule la
+        dernière position des sliders est calculée
+    compute : None (par défaut) : plot_data(**values) fait tout le travail
+        sinon : fonction de calcul compute(**values), exécutée par un
+        BackgroundWorker ; son résultat est transmis à plot_data(result, **values)
+        qui ne fait plus que mettre à jour les courbes
+    worker : 'thread' ou 'process', pour l'exécution de compute
+    table : None (par défaut) ou nombre de points de grille par FloatSlider :
+        mode optionnel où compute est servie par une LookupTable précalculée
+        en arrière-plan (pool de processus) et appelée directement ; la
+        figure est recalculée quand la table est prête (table demande compute)
+    profile : None (par défaut) : variable d'environnement WIDGETS_PROFILE
+        sinon : True (temps de plot_data et du dessin affichés sur la
+        figure) ou 'cprofile' (plus profil cProfile affiché à la sortie)
+    blit : None (par défaut) : toute la figure est redessinée
+        sinon : liste des artistes (Line2D) modifiés par plot_data ; seuls
+        ces artistes et les sliders sont redessinés (voir Blitter)
     """
     f = plt.gcf()
     n = len(parameters)
     x0, y0, W, H = slider_box
     height = H/n
 
-    def update(val=None):
+    profiler = None
+    if profile_mode(profile) is not None:
+        profiler = Profiler(f, cprofile=profile_mode(profile)=='cprofile')
+        plot_data = profiler.wrap(plot_data)
+
+    def render():
+        if blit is None:
+            f.canvas.draw_idle()
+        else:
+            blitter.update()
+
+    def apply(result, values):
+        plot_data(result, **values)
+        render()
+
+    if table is not None and compute is None:
+        raise Exception('table demande une fonction compute')
+    if worker not in ['thread', 'process']:
+        raise Exception('worker "{}" non valide'.format(worker))
+
+    if table is not None:
+        lookup = LookupTable(parameters, compute, steps=table)
+    elif compute is not None:
+        background = BackgroundWorker(f.canvas, compute, apply, worker)
+
+    def refresh():
         values = {}
         for key, w in mpl_widgets.items():
             values[key] = w.val
+        if table is not None:
+            apply(lookup(**values), values)
+            return
+        if compute is not None:
+            background.submit(values)
+            return
         plot_data(**values)
-        plt.draw()
+        render()
+
+    throttle = Throttle(f.canvas, refresh, max_fps)
+
+    def update(val=None):
+        throttle.request()
 
 
 #    default = {key:val.value for key, val in parameters.items()}
-    mpl_widgets = {}
+    mpl_widgets = ParamWidgets()
+    mpl_widgets.request = throttle.request
     for i, (key, elm) in enumerate(parameters.items()):
         ax = f.add_axes([x0, y0+height*i, W, height], facecolor=slider_color)
         mpl_widgets[key] = elm.make_mpl_widget(ax, update)        
-    update()
+    if blit is not None:
+        artists = list(blit)
+        for w in mpl_widgets.values():
+            w.drawon = False
+            artists.append(w.valtext)
+        if profiler is not None:
+            artists.append(profiler.text)
+        blitter = Blitter(f.canvas, artists, [w.ax for w in mpl_widgets.values()])
+        if profiler is not None:
+            blitter.update = profiler.wrap(blitter.update, 'draw')
+    if table is not None:
+        # dès que la table est prête, la figure passe aux valeurs interpolées
+        lookup.start(f.canvas, on_ready=refresh)
+    refresh()
 
     return mpl_widgets
     
 
-def make_choose_plot(lines, box, which=None):
+def make_choose_plot(lines, box, which=None, on_change=None):
     """Create check button for the lines
     lines : all the lines
     box : the box where the check button will be placed
     which : by default (None) : all the plots
         otherwise : key of the lines 
             or tuple of keys (one button for many lines)
+    on_change : None or function on_change(visible) called after each click,
+        e.g. to call param_widgets.refresh and compute the curves that are
+        shown again
+    The widget publishes the visible series in choose_widget.visible
+    ({key: bool}), so that plot_data can skip computing the hidden ones
     """
     f = plt.gcf()
     ax = f.add_axes(box, facecolor=slider_color)
@@ -114,6 +739,7 @@ def make_choose_plot(lines, box, which=None):
         labels.append(key)
         is_active.append(elm.get_visible())
     choose_widget = CheckButtons(ax, labels, is_active)
+    choose_widget.visible = {key: elm.get_visible() for key, elm in lines.items()}
 
     def chooseplot(label):
         states = choose_widget.get_status() 
@@ -124,6 +750,10 @@ def make_choose_plot(lines, box, which=None):
                     lines[k].set_visible(state)
             else:
                 lines[key].set_visible(state)            
+        for key, elm in lines.items():
+            choose_widget.visible[key] = elm.get_visible()
+        if on_change is not None:
+            on_change(choose_widget.visible)
         f.canvas.draw_idle()
 
     choose_widget.on_clicked(chooseplot)
@@ -11,6 +11,7 @@ This code is under licence CC-BY-NC-SA. It enables you to reuse the code by ment
 import matplotlib.pyplot as plt
 import numpy as np
 import widgets
+import titration
 import scipy.constants as constants
 from matplotlib import rc
 
@@ -46,6 +47,10 @@ A=1e-5 #electrode area (m²)
 V_Fe2=10 #titrated volume (mL)
 V0=10 #total volume (mL)
 
+#Titration curve sampling
+adaptive_V=False #True: adaptive volume grid refined around the equivalence point, False: V_domain
+curve_tol=1e-3 #largest Delta E gap between the adaptive curve and its chords (V)
+
 ## Modulated parameters
 
 parameters = {'V' : widgets.FloatSlider(value=0.000001, description='$V$ $\mathrm{(mL)}$', min=0.00000001, max=20)}
@@ -54,119 +59,29 @@ parameters = {'V' : widgets.FloatSlider(value=0.000001, description='$V$ $\mathr
 ### Functions ###
 #################
 
-# Titration volume determination
-def Veq(c0_Fe2,c0_Ce4,V_Fe2):
-    return c0_Fe2*V_Fe2/c0_Ce4
-
-# Fe2+ concentration as a function of the added volume V
-def c_Fe2(V,Veq): 
-    if V<=Veq:
-        return (c0_Fe2*V_Fe2-c0_Ce4*V)/(V0)
-    else:
-        return 0.0000000001 # non-zero value due to a divergent behaviour
-
-# Fe3+ concentration as a function of the added volume V
-def c_Fe3(V,Veq):
-    if V<Veq:
-        return c0_Ce4*V/(V0)
-    else:
-        return c0_Ce4*Veq/(V0)
-    
-# Ce4+ concentration as a function of the added volume V
-def c_Ce4(V,Veq):
-    if V<Veq:
-        return 0.0000000001
-    else:
-        return c0_Ce4*(V-Veq)/(V0)
-
-# Ce3+ concentration as a function of the added volume V    
-def c_Ce3(V,Veq):
-    if V<Veq:
-        return c0_Ce4*V/(V0)
-    else:
-        return c0_Ce4*Veq/(V0)
-
-#Anodic diffusive controlled current
-def i_a(delta,Cred,Dred):
-  return n*F*A*Dred*Cred/delta
-
-#Cathodic diffusive controlled current
-def i_c(delta,Cox,Dox):
-  return -n*F*A*Dox*Cox/delta
-
-#Diffusion-limited current
-def i_diff(delta,Dred,Dox,Cred,Cox,E,E_std):
-    ia=i_a(delta,Cred,Dred)
-    ic=i_c(delta,Cox,Dox)
-    k=(E-E_std)*(n*F)/(R*T)
-    return (np.exp(k)*ia+ic)/(1+np.exp(k))
-
-#i-E Fe data at the added volume V:
-def iE_data_Fe(V,Veq,E):
-    #Concentration calculation
-    Fe2=c_Fe2(V,Veq)
-    Fe3=c_Fe3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Fe=i_diff(delta,D_Fe2,D_Fe3,Fe2,Fe3,E,E_std_Fe)
+#Titration model (computations shared by the titration scripts)
+model=titration.Titration(F=F,R=R,T=T,
+                          E_std_Ce=E_std_Ce,D_Ce3=D_Ce3,D_Ce4=D_Ce4,c0_Ce4=c0_Ce4,
+                          E_std_Fe=E_std_Fe,D_Fe3=D_Fe3,D_Fe2=D_Fe2,c0_Fe2=c0_Fe2,
+                          delta=delta,n=n,A=A,V_Fe2=V_Fe2,V0=V0)
 
-    return i_diff_Fe
+#E(-i0), E(+i0) and Delta E for an array of added volumes
+def titration_crossings(V_domain,i0_values):
+    out=titration.observables(model,V_domain,E,i0=i0_values)
+    return out['E_minus'],out['E_positive'],out['DeltaE']
 
-#i-E data at the added volume V:
-def iE_data_Ce(V,Veq,E):
-    #Concentration calculation
-    Ce4=c_Ce4(V,Veq)
-    Ce3=c_Ce3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Ce=i_diff(delta,D_Ce3,D_Ce4,Ce3,Ce4,E,E_std_Ce)
+#Titration curve (one Delta E curve per value if i0 is an array)
+def titration_curve(V_domain,i0_values=None):
+    if i0_values is None:
+        i0_values=i0
+    return titration_crossings(V_domain,i0_values)[2]
 
-    
-    return i_diff_Ce
-
-#i-E data at the added volume V:
-def iE_data_tot(V,Veq,E):
-    #Concentration calculation
-    Fe2=c_Fe2(V,Veq)
-    Fe3=c_Fe3(V,Veq)
-    Ce4=c_Ce4(V,Veq)
-    Ce3=c_Ce3(V,Veq)
-    
-    #Curve calculation
-    i_diff_Fe=i_diff(delta,D_Fe2,D_Fe3,Fe2,Fe3,E,E_std_Fe)
-    i_diff_Ce=i_diff(delta,D_Ce3,D_Ce4,Ce3,Ce4,E,E_std_Ce)
-    i_diff_tot=i_diff_Fe+i_diff_Ce
-    
-    return i_diff_tot
-
-#Titration spot
-def titration_Eminus(V):
-    i=iE_data_tot(V,Veq,E)
-    counter=0
-    for k in range(0,len(i)):
-        if i[k]<-i0:
-            counter=counter+1
-    return E[counter]
-
-def titration_Epositive(V):
-    i=iE_data_tot(V,Veq,E)
-    counter=0
-    for k in range(0,len(i)):
-        if i[k]<i0:
-            counter=counter+1
-    return E[counter]
-
-def titration_DeltaE(V):
-    Eminus=titration_Eminus(V)
-    Epositive=titration_Epositive(V)
-    return Epositive-Eminus
-
-#Titration curve
-def titration_curve(V_domain):
-    DeltaE_titr=[]
-    for v in V_domain:
-        DeltaE_titr.append(titration_DeltaE(v))
-    return DeltaE_titr
+#Titration curve data (volumes and Delta E), on V_domain or adaptively sampled
+def titration_curve_data():
+    if adaptive_V:
+        V_adaptive,DeltaE_titr,n_eval=titration.adaptive_grid(titration_curve,V_domain.min(),V_domain.max(),tol=curve_tol)
+        return V_adaptive,DeltaE_titr
+    return V_domain,titration_curve(V_domain)
 
 
 
@@ -176,16 +91,19 @@ def titration_curve(V_domain):
 
 # This function is called when the sliders are changed 
 def plot_data(V):
-    lines['$i_\mathrm{Fe}$'].set_data(E,iE_data_Fe(V,Veq,E))
-    lines['$i_\mathrm{Ce}$'].set_data(E,iE_data_Ce(V,Veq,E))
-    lines['$i_\mathrm{tot}$'].set_data(E,iE_data_tot(V,Veq,E))
-    lines['$Titration \ spot$'].set_data(V,titration_DeltaE(V))
-    truc['$i_\mathrm{tot}$'].set_data(E,iE_data_tot(V,Veq,E))
-    truc['$A$'].set_data([titration_Eminus(V),titration_Epositive(V)],[i0,i0])
-    truc['$B$'].set_data([titration_Eminus(V),titration_Eminus(V)],[-i0,i0])
-    truc['$C$'].set_data([titration_Epositive(V),titration_Epositive(V)],[i0,0])
+    i_tot=model.iE_data_tot(V,E)
+    Eminus,Epositive,DeltaE=titration.crossing_potentials(i_tot,E,i0)
+    if choose_widget.visible['$i_\mathrm{Fe}$']:
+        lines['$i_\mathrm{Fe}$'].set_data(E,model.iE_data_Fe(V,E))
+    if choose_widget.visible['$i_\mathrm{Ce}$']:
+        lines['$i_\mathrm{Ce}$'].set_data(E,model.iE_data_Ce(V,E))
+    lines['$i_\mathrm{tot}$'].set_data(E,i_tot)
+    lines['$Titration \ spot$'].set_data(V,DeltaE)
+    truc['$i_\mathrm{tot}$'].set_data(E,i_tot)
+    truc['$A$'].set_data([Eminus,Epositive],[i0,i0])
+    truc['$B$'].set_data([Eminus,Eminus],[-i0,i0])
+    truc['$C$'].set_data([Epositive,Epositive],[i0,0])
     
-    fig.canvas.draw_idle()
 
 
 #===========================================================
@@ -198,7 +116,7 @@ fig=plt.figure(figsize=(18,6))
 fig.suptitle(r'Potentiometric titration $(i=i_0)$  of a $\mathbf{Fe^{2+}}$ solution by a $\mathbf{Ce^{4+}}$ solution',weight='bold')
 
 
-Veq=Veq(c0_Fe2,c0_Ce4,V_Fe2)
+Veq=model.Veq()
 
 i0=1e-9
 i0bis=i0*1e6
@@ -206,6 +124,10 @@ i0bis=i0*1e6
 E=np.arange(0.0001,2.001,0.0011)
 V_domain=np.arange(0.0000001,2*Veq+0.00001,0.01)
 
+#Titration curve and end point detected on it (the divergent start is left out)
+V_curve,DeltaE_curve_0=titration_curve_data()
+Veq_curve=titration.find_endpoints(V_curve,DeltaE_curve_0,order=0,window=(0.05*V_domain.max(),V_domain.max()))
+
 
 
 fig.text(0.01,0.9,r'Titration conditions', multialignment='left', verticalalignment='top',weight='bold')
@@ -215,7 +137,7 @@ fig.text(0.01,0.77,r'$V_0=${:.2f} mL'.format(V_Fe2), multialignment='left', vert
 fig.text(0.01,0.72,r'Titrant solution', multialignment='left', verticalalignment='top')
 fig.text(0.01,0.67,r'$c_1=${:.3f} mol/L'.format(c0_Ce4), multialignment='left', verticalalignment='top')
 fig.text(0.01,0.62,r'End point', multialignment='left', verticalalignment='top')
-fig.text(0.01,0.57,r'$V_e=${:.2f} mL'.format(Veq), multialignment='left', verticalalignment='top')
+fig.text(0.01,0.57,r'$V_e=${:.2f} mL (curve: {:.2f} mL)'.format(Veq,Veq_curve), multialignment='left', verticalalignment='top')
 fig.text(0.01,0.52,r'$i_0=${:.3f} µA'.format(i0bis), multialignment='left', verticalalignment='top')
 
 fig.text(0.01,0.47,r'Dilution is not taken into account.', multialignment='left', verticalalignment='top')
@@ -262,7 +184,7 @@ ax1bis.set_ylabel('Current $i$ $\mathrm{(A)}$')
 
 ax2.plot([Veq,Veq],[-1,1],':',lw=1,color='grey')
 
-ax2.plot(V_domain,titration_curve(V_domain),color='red',lw=3,label='$Titration \ curve$')
+ax2.plot(V_curve,DeltaE_curve_0,color='red',lw=3,label='$Titration \ curve$')
 
 
 
@@ -296,8 +218,9 @@ ax2.legend()
 
 
 
-param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05])
-choose_widget = widgets.make_choose_plot(lines, box=[0.01,0.2,0.12, 0.2])
+level_of_detail = widgets.LevelOfDetail(lines.values())
+choose_widget = widgets.make_choose_plot(lines, box=[0.01,0.2,0.12, 0.2], on_change=lambda visible: param_widgets.refresh())
+param_widgets = widgets.make_param_widgets(parameters, plot_data, slider_box=[0.20, 0.05, 0.35, 0.05], max_fps=30, blit=list(lines.values())+list(truc.values()))
 reset_button = widgets.make_reset_button(param_widgets,box=[0.85, 0.05, 0.10, 0.05])
 
 if __name__=='__main__':
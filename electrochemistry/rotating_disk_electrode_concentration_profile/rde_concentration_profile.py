@@ -9,9 +9,11 @@ This code is under licence CC-BY-NC-SA. It enables you to reuse the code by ment
 
 #Librairies
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.widgets import Slider
+import widgets
 
 #Physical constants
 F=96500.0 #Faraday number (C/mol)
@@ -195,28 +197,60 @@ CRED=Slider(axCred,r'$c_{Red}$ $\mathrm{(mol/L)}$',0,Cred_max,valinit=Cred,color
 #Bulk oxidant concentration slider
 COX=Slider(axCox,r'$c_{Ox}$ $\mathrm{(mol/L)}$',0,Cox_max,valinit=Cox,color='grey')
 
+#Dependency graph: the i-E curve is only recomputed when w, Cred or Cox
+#change, moving E_WE only updates the spot and the concentration profiles
+graph=widgets.Graph({'w':w_init,'Cred':Cred,'Cox':Cox,'Esw':E_init})
+
+@graph.node
+def i_new(w,Cred,Cox):
+    return i(w,Dred,Dox,Cred,Cox,E)
+
+@graph.node
+def delta_red(w):
+    return delta(w,Dred)
+
+@graph.node
+def delta_ox(w):
+    return delta(w,Dox)
+
+@graph.node
+def E_hw(delta_red,delta_ox):
+    return Ehalfwave(delta_red,delta_ox,Dox,Dred)
+
+@graph.node
+def i_max(i_new):
+    return max(i_new)
+
+@graph.node
+def i_min(i_new):
+    return min(i_new)
+
+@graph.node
+def i_sw(w,Cred,Cox,Esw):
+    return i(w,Dred,Dox,Cred,Cox,Esw)
+
 #Graph update
 def update(val):
     #Updated values
-    w=W.val
-    Cred=CRED.val
-    Cox=COX.val
-    Esw=ESW.val
+    graph.update(w=W.val,Cred=CRED.val,Cox=COX.val,Esw=ESW.val)
+    Cred=graph['Cred']
+    Cox=graph['Cox']
+    Esw=graph['Esw']
     
     #Updated calculations
-    i_new=i(w,Dred,Dox,Cred,Cox,E)
+    i_new=graph['i_new']
     
-    delta_red=delta(w,Dred)
-    delta_ox=delta(w,Dox)
+    delta_red=graph['delta_red']
+    delta_ox=graph['delta_ox']
     
-    E_hw=Ehalfwave(delta_red,delta_ox,Dox,Dred)
-    i_hw=(max(i_new)+min(i_new))/2
+    E_hw=graph['E_hw']
+    i_hw=(graph['i_max']+graph['i_min'])/2
     
-    k_red=Cred/max(i_new)
-    Cred_0=Cred-k_red*i(w,Dred,Dox,Cred,Cox,Esw)
+    k_red=Cred/graph['i_max']
+    Cred_0=Cred-k_red*graph['i_sw']
     
-    k_ox=Cox/min(i_new)
-    Cox_0=Cox-k_ox*i(w,Dred,Dox,Cred,Cox,Esw)
+    k_ox=Cox/graph['i_min']
+    Cox_0=Cox-k_ox*graph['i_sw']
     
     #Updated curves
     iEcurve.set_ydata(i_new)
@@ -225,11 +259,11 @@ def update(val):
     xE_hw.set_ydata([i_hw,0])
     yE_hw.set_xdata([min(E),E_hw])
     yE_hw.set_ydata([i_hw,i_hw])
-    imax_axis.set_ydata([max(i_new),max(i_new)])
-    imin_axis.set_ydata([min(i_new),min(i_new)])
+    imax_axis.set_ydata([graph['i_max'],graph['i_max']])
+    imin_axis.set_ydata([graph['i_min'],graph['i_min']])
     
     ptE.set_xdata(Esw)
-    ptE.set_ydata(i(w,Dred,Dox,Cred,Cox,Esw))
+    ptE.set_ydata(graph['i_sw'])
     
     xdelta_red.set_xdata([delta_red,delta_red])
     xdelta_red.set_ydata([0,Cred])
@@ -249,6 +283,10 @@ def update(val):
     #Graph refresh
     fig.canvas.draw_idle()
 
+#Optional profiling of the update callback (WIDGETS_PROFILE=1 or WIDGETS_PROFILE=cprofile)
+if widgets.profile_mode() is not None:
+    update=widgets.Profiler(fig,cprofile=widgets.profile_mode()=='cprofile').wrap(update)
+
 #Call update function on slider value change
 W.on_changed(update)
 CRED.on_changed(update)
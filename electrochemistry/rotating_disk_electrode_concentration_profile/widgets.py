@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov  2 10:05:06 2020
+
+@author: Vincent
+"""
+
+""" Extrait de widgets.py pour les scripts à Slider matplotlib
+Une class Graph qui ne recalcule que les grandeurs dont les paramètres
+ont changé.
+Une class Profiler qui mesure les callbacks (activée par la variable
+d'environnement WIDGETS_PROFILE=1 ou WIDGETS_PROFILE=cprofile).
+Les blocs sont copiés sans modification de widgets.py (dossiers des
+titrages), qui contient aussi les sliders, le blitting, etc.
+"""
+
+import os
+import time
+import atexit
+import cProfile
+import pstats
+import inspect
+from collections import deque
+
+import numpy as np
+
+
+class Widget(object):
+    value = None
+    description = ""
+    def __init__(self, **kwd):
+        for key, val in kwd.items():
+            if not hasattr(type(self), key):
+                raise Exception('Attribut "{}" non valide'.format(key))
+            setattr(self, key, val)
+
+
+class Graph(object):
+    """ Graphe de dépendances des grandeurs calculées
+    parameters : dictionnaire des paramètres (Widget ou valeurs initiales)
+    Chaque grandeur est déclarée avec le décorateur node : le nom des
+    arguments de la fonction donne ses dépendances (paramètres ou autres
+    grandeurs). update(**values) invalide uniquement les grandeurs qui
+    dépendent, directement ou non, des paramètres modifiés ; graph[name]
+    renvoie la valeur mémorisée ou la recalcule.
+
+    graph = Graph(parameters)
+    @graph.node
+    def curve(DeltaB):
+        return signal(B, DeltaB)
+    graph.update(B0=0.2, DeltaB=0.05)
+    graph['curve']
+    """
+    def __init__(self, parameters={}):
+        self.values = {}
+        for key, val in parameters.items():
+            if isinstance(val, Widget):
+                val = val.value
+            self.values[key] = val
+        self.nodes = {}
+        self.cache = {}
+
+    def node(self, function):
+        self.nodes[function.__name__] = (function, list(inspect.signature(function).parameters))
+        return function
+
+    def update(self, **values):
+        changed = set()
+        for key, val in values.items():
+            if key not in self.values or self.values[key]!=val:
+                changed.add(key)
+            self.values[key] = val
+        self.invalidate(changed)
+        return changed
+
+    def invalidate(self, names):
+        stale = set(names)
+        done = False
+        while not done:
+            done = True
+            for name, (function, args) in self.nodes.items():
+                if name not in stale and stale.intersection(args):
+                    stale.add(name)
+                    done = False
+        for name in stale:
+            self.cache.pop(name, None)
+
+    def __getitem__(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.cache:
+            function, args = self.nodes[name]
+            self.cache[name] = function(*[self[arg] for arg in args])
+        return self.cache[name]
+
+
+def profile_mode(profile=None):
+    """ Renvoie None, 'time' ou 'cprofile'
+    profile : None : valeur de la variable d'environnement WIDGETS_PROFILE
+    """
+    if profile is None:
+        profile = os.environ.get('WIDGETS_PROFILE', '')
+    if profile in ('', '0', False):
+        return None
+    if profile=='cprofile':
+        return 'cprofile'
+    return 'time'
+
+
+class Profiler(object):
+    """ Mesure des callbacks
+    fig : figure où sont affichés les temps de calcul et de dessin (dernier
+        et moyenne glissante sur window événements)
+    cprofile : si True, les callbacks sont aussi profilés par cProfile
+    Les dessins complets de la figure sont chronométrés automatiquement ;
+    wrap(function) chronomètre un callback (plot_data, update...). À la
+    sortie du programme, un résumé et les top fonctions les plus
+    coûteuses sont affichés.
+    """
+    def __init__(self, fig, cprofile=False, window=20, top=15):
+        self.recent = {'compute': deque(maxlen=window), 'draw': deque(maxlen=window)}
+        self.times = {'compute': [], 'draw': []}
+        self.top = top
+        self.profile = cProfile.Profile() if cprofile else None
+        self.text = fig.text(0.995, 0.005, '', ha='right', va='bottom',
+                             fontsize=8, family='monospace', color='grey')
+        draw = fig.draw
+
+        def timed_draw(renderer):
+            t0 = time.perf_counter()
+            draw(renderer)
+            self.add('draw', time.perf_counter()-t0)
+
+        fig.draw = timed_draw
+        atexit.register(self.dump)
+
+    def wrap(self, function, key='compute'):
+        def timed(*args, **kwd):
+            t0 = time.perf_counter()
+            if self.profile is not None and key=='compute':
+                self.profile.enable()
+            try:
+                return function(*args, **kwd)
+            finally:
+                if self.profile is not None and key=='compute':
+                    self.profile.disable()
+                self.add(key, time.perf_counter()-t0)
+                if key=='compute':
+                    self.show()
+        return timed
+
+    def add(self, key, dt):
+        self.recent[key].append(1e3*dt)
+        self.times[key].append(1e3*dt)
+
+    def show(self):
+        # pas appelée pendant un dessin : modifier le texte relancerait un dessin
+        lines = []
+        for key in ['compute', 'draw']:
+            if self.recent[key]:
+                lines.append('{} {:7.1f} ms (moy. {:7.1f})'.format(key, self.recent[key][-1], np.mean(self.recent[key])))
+        self.text.set_text('\n'.join(lines))
+
+    def dump(self):
+        for key in ['compute', 'draw']:
+            times = self.times[key]
+            if times:
+                print('{} : {} appels, médiane {:.1f} ms, max {:.1f} ms'.format(key, len(times), np.median(times), np.max(times)))
+        if self.profile is not None:
+            pstats.Stats(self.profile).sort_stats('cumulative').print_stats(self.top)
@@ -12,6 +12,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.widgets import Slider
+import widgets
 
 #Physical constants
 F=96500.0 #Faraday number (C/mol)
@@ -168,44 +169,71 @@ ETA=Slider(axETA, r'$\eta$ $(V)$', min(eta), max(eta), valinit=etavalue_init,col
 ALPHA=Slider(axALPHA, r'$\alpha$', 0.1, 0.9, valinit=alpha,color='grey')
 
 
+#Dependency graph: each curve is only recomputed when its parameters change
+#(i_diff does not depend on alpha, the curves do not depend on eta)
+graph=widgets.Graph({'etavalue':etavalue_init,'alphavalue':alpha})
+
+@graph.node
+def idiff_new():
+    return i_diff(delta,Dred,Dox,Cred,Cox,eta)
+
+@graph.node
+def icharge_new(alphavalue):
+    return i_charge(i0,alphavalue,eta)
+
+@graph.node
+def itot_new(idiff_new,icharge_new):
+    return i_tot(idiff_new,icharge_new)
+
+@graph.node
+def logidiff_new(idiff_new):
+    return log_i(idiff_new)
+
+@graph.node
+def logicharge_new(icharge_new):
+    return log_i(icharge_new)
+
+@graph.node
+def logitot_new(itot_new):
+    return log_i(itot_new)
+
+@graph.node
+def itot_pt(etavalue,alphavalue):
+    idiff_pt=i_diff(delta,Dred,Dox,Cred,Cox,etavalue)
+    icharge_pt=i_charge(i0,alphavalue,etavalue)
+    return i_tot(idiff_pt,icharge_pt)
+
+@graph.node
+def logitot_pt(itot_pt):
+    return log_i(itot_pt)
+
 #Graph update
 def update(val):
     #Updated values
-    etavalue=ETA.val
-    alphavalue=ALPHA.val
-    
-        #Updated calculations
-    idiff_new=i_diff(delta,Dred,Dox,Cred,Cox,eta)
-    icharge_new=i_charge(i0,alphavalue,eta)
-    itot_new=i_tot(idiff_new,icharge_new)
-    
-    logidiff_new=log_i(idiff_new)
-    logicharge_new=log_i(icharge_new)
-    logitot_new=log_i(itot_new)    
-    
-    idiff_pt=i_diff(delta,Dred,Dox,Cred,Cox,etavalue)
-    icharge_pt=i_charge(i0,alphavalue,etavalue)
-    itot_pt=i_tot(idiff_pt,icharge_pt)
-    logitot_pt=log_i(itot_pt)   
+    graph.update(etavalue=ETA.val,alphavalue=ALPHA.val)
     
     #Updated curves
-    curve_idiff.set_ydata(idiff_new)
-    curve_icharge.set_ydata(icharge_new)
-    curve_itot.set_ydata(itot_new)
+    curve_idiff.set_ydata(graph['idiff_new'])
+    curve_icharge.set_ydata(graph['icharge_new'])
+    curve_itot.set_ydata(graph['itot_new'])
     
-    curve_logidiff.set_ydata(logidiff_new)
-    curve_logicharge.set_ydata(logicharge_new)
-    curve_logitot.set_ydata(logitot_new)
+    curve_logidiff.set_ydata(graph['logidiff_new'])
+    curve_logicharge.set_ydata(graph['logicharge_new'])
+    curve_logitot.set_ydata(graph['logitot_new'])
     
-    etapt.set_xdata(etavalue)
-    etapt.set_ydata(itot_pt)
+    etapt.set_xdata(graph['etavalue'])
+    etapt.set_ydata(graph['itot_pt'])
         
-    logetapt.set_xdata(etavalue)
-    logetapt.set_ydata(logitot_pt)
+    logetapt.set_xdata(graph['etavalue'])
+    logetapt.set_ydata(graph['logitot_pt'])
     
     #Graph refresh
     fig.canvas.draw_idle()
 
+#Optional profiling of the update callback (WIDGETS_PROFILE=1 or WIDGETS_PROFILE=cprofile)
+if widgets.profile_mode() is not None:
+    update=widgets.Profiler(fig,cprofile=widgets.profile_mode()=='cprofile').wrap(update)
+
 #Call update function on slider value change
 ETA.on_changed(update)
 ALPHA.on_changed(update)
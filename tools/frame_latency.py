@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Python code provided as is.
+Made by Vincent Wieczny, from Chemistry Department, ENS de Lyon, France
+This code is under licence CC-BY-NC-SA. It enables you to reuse the code by mentioning the orginal author and without making profit from it.
+"""
+
+""" Mesure de la réactivité des scripts à sliders
+Enregistrement : le script est lancé normalement et chaque changement de
+valeur d'un Slider (widgets.make_param_widgets ou matplotlib.widgets.Slider)
+est enregistré dans une trace JSON à la fermeture de la fenêtre :
+    python tools/frame_latency.py record script.py -o trace.json
+Rejeu : le script est exécuté sans fenêtre (backend Agg) et la trace est
+rejouée ; pour chaque événement on mesure le temps de calcul (callbacks
+des sliders) et le temps de dessin de la figure. Un script .py sans trace
+est rejoué avec un balayage synthétique de chaque slider :
+    python tools/frame_latency.py replay trace.json script2.py --json out.json
+Le rapport donne p50/p95/p99 du calcul, du dessin et du total (ms).
+"""
+
+import os
+import sys
+import json
+import time
+import runpy
+import argparse
+
+import numpy as np
+
+
+def run_script(script):
+    """ Exécute script comme __main__ depuis son dossier, sans bloquer sur
+    plt.show ; renvoie la liste des sliders dans l'ordre de création et
+    les variables globales du script """
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Slider
+
+    sliders = []
+    init = Slider.__init__
+
+    def register(self, *args, **kwd):
+        init(self, *args, **kwd)
+        sliders.append(self)
+
+    script = os.path.abspath(script)
+    folder = os.path.dirname(script)
+    cwd = os.getcwd()
+    show = plt.show
+    for name in ['widgets', 'titration']:
+        sys.modules.pop(name, None)
+    Slider.__init__ = register
+    plt.show = lambda *args, **kwd: None
+    sys.path.insert(0, folder)
+    os.chdir(folder)
+    try:
+        namespace = runpy.run_path(script, run_name='__main__')
+    finally:
+        Slider.__init__ = init
+        plt.show = show
+        sys.path.remove(folder)
+        os.chdir(cwd)
+    return sliders, namespace
+
+
+def slider_name(slider):
+    return slider.label.get_text()
+
+
+def synthetic_trace(script, sliders, steps=20):
+    """ Balaye chaque slider de min à max puis revient à sa valeur initiale """
+    events = []
+    for index, slider in enumerate(sliders):
+        for value in np.linspace(slider.valmin, slider.valmax, steps):
+            events.append({'slider': index, 'name': slider_name(slider), 'value': float(value)})
+        events.append({'slider': index, 'name': slider_name(slider), 'value': float(slider.valinit)})
+    return {'script': os.path.abspath(script), 'events': events}
+
+
+def record(script, output):
+    """ Lance le script avec son interface et enregistre les événements """
+    from matplotlib.widgets import Slider
+
+    events = []
+    sliders = []
+    init = Slider.__init__
+    set_val = Slider.set_val
+    start = time.perf_counter()
+
+    def register(self, *args, **kwd):
+        init(self, *args, **kwd)
+        sliders.append(self)
+
+    def recorded_set_val(self, val):
+        if self in sliders:
+            events.append({'slider': sliders.index(self), 'name': slider_name(self),
+                           'value': float(val), 'time': time.perf_counter()-start})
+        set_val(self, val)
+
+    Slider.__init__ = register
+    Slider.set_val = recorded_set_val
+    script = os.path.abspath(script)
+    output = os.path.abspath(output)
+    folder = os.path.dirname(script)
+    cwd = os.getcwd()
+    sys.path.insert(0, folder)
+    os.chdir(folder)
+    try:
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        Slider.__init__ = init
+        Slider.set_val = set_val
+        sys.path.remove(folder)
+        os.chdir(cwd)
+    with open(output, 'w') as f:
+        json.dump({'script': script, 'events': events}, f, indent=1)
+    return events
+
+
+def replay(trace=None, script=None, steps=20):
+    """ Rejoue une trace (ou un balayage synthétique de script) sous Agg
+    Renvoie un dictionnaire de tableaux (ms) : compute, draw, total """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backend_bases import FigureCanvasBase
+
+    if trace is not None:
+        script = trace['script']
+    sliders, namespace = run_script(script)
+    if trace is None:
+        trace = synthetic_trace(script, sliders, steps)
+
+    # draw_idle dessine immédiatement sous Agg : on note seulement la figure
+    # à redessiner pour mesurer le dessin séparément du calcul
+    dirty = []
+    draw_idle = FigureCanvasBase.draw_idle
+    FigureCanvasBase.draw_idle = lambda self, *args, **kwd: dirty.append(self)
+    for canvas in set(slider.ax.figure.canvas for slider in sliders):
+        canvas.draw()
+    compute = []
+    draw = []
+    try:
+        for event in trace['events']:
+            slider = sliders[event['slider']]
+            del dirty[:]
+            t0 = time.perf_counter()
+            slider.set_val(event['value'])
+            t1 = time.perf_counter()
+            for canvas in set(dirty):
+                canvas.draw()
+            t2 = time.perf_counter()
+            compute.append(1e3*(t1-t0))
+            draw.append(1e3*(t2-t1))
+    finally:
+        FigureCanvasBase.draw_idle = draw_idle
+        plt.close('all')
+    compute = np.array(compute)
+    draw = np.array(draw)
+    return {'script': script, 'compute': compute, 'draw': draw, 'total': compute+draw}
+
+
+def summary(result):
+    out = {'script': result['script'], 'events': len(result['total'])}
+    for key in ['compute', 'draw', 'total']:
+        p50, p95, p99 = np.percentile(result[key], [50, 95, 99]) if len(result[key]) else (np.nan,)*3
+        out[key] = {'p50': p50, 'p95': p95, 'p99': p99}
+    return out
+
+
+def report(summaries):
+    lines = ['{:<40} {:>6}  {:>22}  {:>22}  {:>22}'.format(
+        'script', 'events', 'compute p50/p95/p99', 'draw p50/p95/p99', 'total p50/p95/p99')]
+    for s in summaries:
+        cells = ['{p50:6.1f} {p95:6.1f} {p99:6.1f}'.format(**s[key]) for key in ['compute', 'draw', 'total']]
+        lines.append('{:<40} {:>6}  {:>22}  {:>22}  {:>22}'.format(
+            os.path.basename(s['script'])[:40], s['events'], *cells))
+    return '\n'.join(lines)
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Record and replay slider interactions, report frame latency (ms)')
+    commands = parser.add_subparsers(dest='command')
+    parser_record = commands.add_parser('record', help='run a script and record its slider events')
+    parser_record.add_argument('script')
+    parser_record.add_argument('-o', '--output', default='trace.json')
+    parser_replay = commands.add_parser('replay', help='replay traces (.json) or synthetic sweeps of scripts (.py) under Agg')
+    parser_replay.add_argument('paths', nargs='+')
+    parser_replay.add_argument('--steps', type=int, default=20, help='values per slider for synthetic sweeps')
+    parser_replay.add_argument('--json', help='save the percentiles to this file')
+    args = parser.parse_args()
+
+    if args.command=='record':
+        events = record(args.script, args.output)
+        print('{} events saved in {}'.format(len(events), args.output))
+    elif args.command=='replay':
+        summaries = []
+        for path in args.paths:
+            if path.endswith('.json'):
+                with open(path) as f:
+                    result = replay(trace=json.load(f))
+            else:
+                result = replay(script=path, steps=args.steps)
+            summaries.append(summary(result))
+        print(report(summaries))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(summaries, f, indent=1)
+    else:
+        parser.print_help()
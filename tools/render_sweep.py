@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Python code provided as is.
+Made by Vincent Wieczny, from Chemistry Department, ENS de Lyon, France
+This code is under licence CC-BY-NC-SA. It enables you to reuse the code by mentioning the orginal author and without making profit from it.
+"""
+
+""" Rendu hors écran d'un balayage de paramètres (vidéo ou images)
+Là où make_start_stop_animation anime la figure en direct, ce programme
+exécute un script à sliders sous Agg et fait varier ses paramètres le
+long d'un chemin (interpolation linéaire entre min et max, même nombre
+d'images pour tous les paramètres). Les paramètres sont les clés du
+dictionnaire parameters (widgets.make_param_widgets) ou les noms des
+variables Slider du script :
+    python tools/render_sweep.py script.py --param V 0 20 --frames 2000 -o titrage.mp4
+    python tools/render_sweep.py script.py --param V 0 20 --frames 2000 -o titrage.mp4 --fast
+Les images sont réparties par blocs contigus sur un pool de processus ;
+chaque processus exécute le script une fois, rejoue (sans dessin) les
+valeurs qui précèdent son bloc pour retrouver l'état des scripts qui
+accumulent des points, puis écrit ses images en PNG. Chaque image est
+un dessin complet de la figure ; avec --fast, seules les courbes et les
+patchs modifiés par les callbacks (Line2D, Patch, détectés par leur
+attribut stale) et le texte des sliders sont redessinés sur un fond
+mémorisé, comme avec widgets.Blitter, puis les légendes de leurs axes ;
+ils passent alors au-dessus des spines. Le fond n'est recalculé que si
+les limites des axes ou les textes changent, et chaque nouveau fond est
+vérifié sur un dessin complet : si plus d'une fraction max_difference
+des pixels diffère, le processus revient au dessin complet. La vidéo
+(.mp4, .gif...) est assemblée par ffmpeg ; sinon la sortie est un
+dossier d'images.
+"""
+
+import os
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from frame_latency import run_script
+
+video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm', '.gif']
+
+# fraction des pixels d'une image rapide qui peuvent différer du dessin complet
+max_difference = 1e-3
+
+state = {}
+
+
+def find_controls(namespace, names):
+    """ Slider associé à chaque nom de paramètre """
+    from matplotlib.widgets import Slider
+
+    param_widgets = namespace.get('param_widgets', {})
+    controls = {}
+    for name in names:
+        if name in param_widgets:
+            controls[name] = param_widgets[name]
+        elif isinstance(namespace.get(name), Slider):
+            controls[name] = namespace[name]
+        else:
+            raise Exception('Paramètre "{}" non trouvé'.format(name))
+    return controls
+
+
+def init_worker(script, names, fast, dpi):
+    """ Exécute le script dans le processus (une seule fois) """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.backend_bases import FigureCanvasBase
+
+    # draw_idle dessine immédiatement sous Agg : les images sont dessinées
+    # explicitement, une seule fois chacune
+    FigureCanvasBase.draw_idle = lambda self, *args, **kwd: None
+    sliders, namespace = run_script(script)
+    controls = find_controls(namespace, names)
+    fig = list(controls.values())[0].ax.figure
+    if dpi is not None:
+        fig.set_dpi(dpi)
+    state.update(controls=controls, fig=fig, fast=fast, artists=[], background=None, key=None,
+                 texts=[control.valtext for control in controls.values()])
+
+
+def set_values(values):
+    for name, value in values.items():
+        state['controls'][name].set_val(value)
+
+
+def is_dynamic(artist):
+    """ Courbes et patchs, hors spines et fond des axes : artistes que les
+    callbacks mettent à jour """
+    from matplotlib.lines import Line2D
+    from matplotlib.patches import Patch
+    from matplotlib.spines import Spine
+
+    return (isinstance(artist, (Line2D, Patch)) and not isinstance(artist, Spine)
+            and all(artist is not ax.patch for ax in state['fig'].axes))
+
+
+def changed_artists(fig):
+    """ Courbes et patchs non animés modifiés depuis le dernier dessin
+    (l'attribut stale n'est fiable que pour eux) """
+    return [artist for ax in fig.axes for artist in ax.get_children()
+            if artist.stale and not artist.get_animated() and is_dynamic(artist)]
+
+
+def background_key(fig):
+    """ Ce qui forme le fond : limites et échelles des axes, textes (hors
+    texte des sliders) """
+    key = [(text.get_text(), text.get_visible()) for text in fig.texts]
+    for ax in fig.axes:
+        key += [tuple(ax.viewLim.bounds), ax.get_xscale(), ax.get_yscale(),
+                ax.get_title(), ax.get_xlabel(), ax.get_ylabel()]
+        key += [(text.get_text(), text.get_visible()) for text in ax.texts
+                if text not in state['texts']]
+    return key
+
+
+def draw_order(artists):
+    """ Artistes dans l'ordre du dessin complet : par axes, puis zorder,
+    puis ordre d'ajout """
+    position = {}
+    for i, ax in enumerate(state['fig'].axes):
+        for j, artist in enumerate(ax.get_children()):
+            position[artist] = (i, artist.get_zorder(), j)
+    return sorted(set(artists), key=lambda artist: position[artist])
+
+
+def blit():
+    canvas = state['fig'].canvas
+    canvas.restore_region(state['background'])
+    for artist in state['artists']:
+        state['fig'].draw_artist(artist)
+
+
+def update_background(changed):
+    """ Passe les artistes de changed au premier plan, mémorise le fond et
+    vérifie l'image obtenue sur un dessin complet """
+    fig = state['fig']
+    canvas = fig.canvas
+    for artist in state['artists']:
+        artist.set_animated(False)
+    canvas.draw()
+    reference = np.array(canvas.buffer_rgba())
+    # les légendes sont redessinées par-dessus les courbes, comme dans le
+    # dessin complet
+    artists = state['artists']+state['texts']+changed
+    legends = [ax.get_legend() for ax in {artist.axes for artist in artists}]
+    state['artists'] = draw_order(artists+[legend for legend in legends if legend is not None])
+    for artist in state['artists']:
+        artist.set_animated(True)
+    canvas.draw()
+    state.update(background=canvas.copy_from_bbox(fig.bbox), key=background_key(fig))
+    blit()
+    # les artistes animés passent au-dessus des spines : seuls quelques
+    # pixels peuvent différer du dessin complet
+    different = np.any(np.asarray(canvas.buffer_rgba())!=reference, axis=2).mean()
+    if different>max_difference:
+        print('Rendu rapide différent du dessin complet ({:.2%} des pixels) : '
+              'dessin complet de chaque image'.format(different))
+        for artist in state['artists']:
+            artist.set_animated(False)
+        state.update(fast=False, artists=[], background=None)
+        canvas.draw()
+
+
+def draw_frame():
+    """ Dessine l'image courante : dessin complet, ou (fast) artistes
+    animés sur le fond mémorisé """
+    fig = state['fig']
+    canvas = fig.canvas
+    if not state['fast']:
+        canvas.draw()
+        return
+    # nouveau fond si une courbe jusque-là immobile est modifiée ou si les
+    # axes ou les textes changent
+    changed = changed_artists(fig)
+    if state['background'] is None or changed or background_key(fig)!=state['key']:
+        update_background(changed)
+    else:
+        blit()
+
+
+def render_chunk(path, start, stop, folder):
+    """ Rejoue les images 0..start-1 sans dessin puis écrit start..stop-1 """
+    import matplotlib.image as mpimg
+
+    for index in range(start):
+        set_values({name: values[index] for name, values in path.items()})
+    state['fig'].canvas.draw()
+    for index in range(start, stop):
+        set_values({name: values[index] for name, values in path.items()})
+        draw_frame()
+        image = np.asarray(state['fig'].canvas.buffer_rgba())[:, :, :3]
+        # compression rapide : les images sont temporaires pour une vidéo
+        mpimg.imsave(os.path.join(folder, 'frame_{:06d}.png'.format(index)), image,
+                     pil_kwargs={'compress_level': 1})
+    return stop-start
+
+
+def render_sweep(script, path, output, max_workers=None, fast=False, dpi=None, fps=30):
+    """ Rend le balayage path ({nom: tableau de valeurs}) de script
+    output : dossier d'images PNG ou fichier vidéo (assemblé par ffmpeg)
+    fast : False (par défaut) : dessin complet de chaque image
+        True : seuls les artistes dynamiques sont redessinés (voir draw_frame)
+    Renvoie le chemin des images ou de la vidéo.
+    """
+    script = os.path.abspath(script)
+    n_frames = len(list(path.values())[0])
+    video = os.path.splitext(output)[1].lower() in video_extensions
+    if video and shutil.which('ffmpeg') is None:
+        print('ffmpeg non trouvé : images écrites dans {}'.format(output+'_frames'))
+        output = output+'_frames'
+        video = False
+    folder = tempfile.mkdtemp() if video else output
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    n_workers = min(max_workers or os.cpu_count() or 1, n_frames)
+    bounds = np.linspace(0, n_frames, n_workers+1).astype(int)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                             initargs=(script, list(path), fast, dpi)) as executor:
+        futures = [executor.submit(render_chunk, path, start, stop, folder)
+                   for start, stop in zip(bounds[:-1], bounds[1:]) if stop>start]
+        for future in futures:
+            future.result()
+
+    if not video:
+        return folder
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps),
+               '-i', os.path.join(folder, 'frame_%06d.png')]
+    if not output.lower().endswith('.gif'):
+        # yuv420p (lecteurs courants) demande des dimensions paires
+        command += ['-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    subprocess.check_call(command+[os.path.abspath(output)])
+    shutil.rmtree(folder)
+    return output
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Render a parameter sweep of a slider script with Agg on a process pool')
+    parser.add_argument('script')
+    parser.add_argument('--param', nargs=3, action='append', required=True, metavar=('NAME', 'START', 'STOP'),
+                        help='parameter (parameters key or Slider variable) swept linearly')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('-o', '--output', default='frames', help='image directory or video file (.mp4, .gif...)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--dpi', type=float, default=None)
+    parser.add_argument('--fast', action='store_true',
+                        help='redraw only the updated lines, patches and slider texts on a cached background '
+                             '(checked against a full draw); by default each frame is fully drawn')
+    args = parser.parse_args()
+
+    path = {name: np.linspace(float(start), float(stop), args.frames) for name, start, stop in args.param}
+    out = render_sweep(args.script, path, args.output, max_workers=args.workers,
+                       fast=args.fast, dpi=args.dpi, fps=args.fps)
+    print('{} frames in {}'.format(args.frames, out))